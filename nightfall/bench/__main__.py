@@ -0,0 +1,3 @@
+from nightfall.bench.main import main
+
+main()
@@ -0,0 +1,171 @@
+"""
+Turn-simulation benchmark suite.
+
+Generates a synthetic world, times the hot paths of the simulation and the
+state serialization, and prints the results as JSON. A previous result file
+can be passed as a baseline; any benchmark whose median time grew by more than
+the threshold is reported as a regression and makes the command exit with 1.
+
+Example:
+    bench --players 8 --cities-per-player 4 --output results.json
+    bench --baseline results.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, Optional
+from nightfall.bench.worldgen import WorldConfig, generate_world
+from nightfall.core.engine.production import city_production, get_array_engine
+from nightfall.core.engine.simulator import Simulator
+from nightfall.core.protocol.codec import BINARY_CODEC, JSON_CODEC
+from nightfall.core.state.game_state import GameState
+
+DEFAULT_REPEATS = 20
+DEFAULT_THRESHOLD = 0.10 # 10% slower than the baseline counts as a regression
+
+
+def _time(func: Callable, repeats: int, setup: Optional[Callable] = None) -> Dict[str, float]:
+    """Runs `func` `repeats` times, calling `setup` (untimed) before each run and passing its result."""
+    samples = []
+    for _ in range(repeats):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        func(arg)
+        samples.append(time.perf_counter() - start)
+    return {
+        'repeats': repeats,
+        'min_s': min(samples),
+        'median_s': statistics.median(samples),
+        'mean_s': statistics.fmean(samples),
+        'max_s': max(samples),
+    }
+
+
+def run_benchmarks(state: GameState, repeats: int) -> Dict[str, Dict[str, float]]:
+    """Times every benchmarked operation against the given state. The state itself is not modified."""
+    simulator = Simulator()
+    player_id, player = next(iter(state.players.items()))
+    cities = list(state.cities.values())
+    state_dict = state.to_dict()
+    results = {}
+
+    results['simulate_full_turn'] = _time(simulator.simulate_full_turn, repeats, setup=state.deep_copy)
+    results['predict_outcome'] = _time(
+        lambda _: simulator.predict_outcome(state, list(player.action_queue), player_id), repeats
+    )
+    results['validate_queue'] = _time(lambda _: simulator.validate_queue(state, player.action_queue), repeats)
+    results['calculate_resource_production'] = _time(
+        lambda _: [simulator.calculate_resource_production(state, city) for city in cities], repeats
+    )
+    results['calculate_all_resource_production'] = _time(
+        lambda _: simulator.calculate_all_resource_production(state), repeats
+    )
+    results['city_production_python'] = _time(lambda _: [city_production(city.city_map) for city in cities], repeats)
+    if get_array_engine():
+        engine = get_array_engine()
+        results['city_production_array'] = _time(lambda _: engine.calculate_batch(c.city_map for c in cities), repeats)
+    results['deep_copy'] = _time(lambda _: state.deep_copy(), repeats)
+    results['to_json_string'] = _time(lambda _: state.to_json_string(), repeats)
+    results['from_dict'] = _time(lambda _: GameState.from_dict(state_dict), repeats)
+    for codec in (JSON_CODEC, BINARY_CODEC):
+        encode = lambda _, codec=codec: codec.encode(
+            {'type': 'state_update', 'payload': state.to_dict(map_format=codec.map_format)}
+        )
+        encoded = encode(None)
+        results[f'encode_state_{codec.name}'] = _time(encode, repeats)
+        results[f'decode_state_{codec.name}'] = _time(
+            lambda _, codec=codec, encoded=encoded: GameState.from_dict(codec.decode(encoded)['payload']), repeats
+        )
+    return results
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float) -> Dict[str, dict]:
+    """Compares median timings with a baseline report. Benchmarks missing from either side are skipped."""
+    comparison = {}
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('median_s'):
+            continue
+        ratio = result['median_s'] / base['median_s']
+        comparison[name] = {
+            'baseline_median_s': base['median_s'],
+            'median_s': result['median_s'],
+            'ratio': ratio,
+            'regressed': ratio > 1.0 + threshold,
+        }
+    return comparison
+
+
+def build_parser() -> argparse.ArgumentParser:
+    defaults = WorldConfig()
+    parser = argparse.ArgumentParser(description="Benchmark Nightfall turn simulation on a synthetic world.")
+    parser.add_argument('--players', type=int, default=defaults.players)
+    parser.add_argument('--cities-per-player', type=int, default=defaults.cities_per_player)
+    parser.add_argument('--city-width', type=int, default=defaults.city_width)
+    parser.add_argument('--city-height', type=int, default=defaults.city_height)
+    parser.add_argument('--building-density', type=float, default=defaults.building_density)
+    parser.add_argument('--queue-length', type=int, default=defaults.queue_length)
+    parser.add_argument('--world-width', type=int, default=defaults.world_width)
+    parser.add_argument('--world-height', type=int, default=defaults.world_height)
+    parser.add_argument('--seed', type=int, default=defaults.seed)
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS)
+    parser.add_argument('--baseline', help="Path to a previous JSON report to compare against.")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative slowdown of the median before a benchmark counts as regressed.")
+    parser.add_argument('--output', help="Also write the JSON report to this file.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    config = WorldConfig(
+        players=args.players,
+        cities_per_player=args.cities_per_player,
+        city_width=args.city_width,
+        city_height=args.city_height,
+        building_density=args.building_density,
+        queue_length=args.queue_length,
+        world_width=args.world_width,
+        world_height=args.world_height,
+        seed=args.seed,
+    )
+
+    # The simulation logs to stdout; keep it out of the JSON report.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        state = generate_world(config)
+        results = run_benchmarks(state, args.repeats)
+
+    report = {
+        'config': config.to_dict(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': get_array_engine() is not None,
+        },
+        'results': results,
+    }
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        report['threshold'] = args.threshold
+        report['comparison'] = compare_to_baseline(results, baseline, args.threshold)
+        regressed = any(c['regressed'] for c in report['comparison'].values())
+
+    report_json = json.dumps(report, indent=2)
+    print(report_json)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_json)
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
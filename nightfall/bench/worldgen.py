@@ -0,0 +1,101 @@
+"""
+Synthetic world generation for benchmarks.
+
+Worlds are built directly from the core components (no data files), and are
+fully determined by the configuration and the random seed so that runs are
+comparable across commits.
+"""
+import random
+from dataclasses import asdict, dataclass
+from typing import List
+from nightfall.core.actions.action import Action
+from nightfall.core.actions.city_actions import BuildBuildingAction, DemolishAction, UpgradeBuildingAction
+from nightfall.core.common.datatypes import Position, Resources
+from nightfall.core.common.enums import BuildingType, CityTerrainType, TerrainType
+from nightfall.core.common.game_data import BUILDING_DATA
+from nightfall.core.components.city import Building, City, CityMap
+from nightfall.core.components.map import GameMap
+from nightfall.core.components.player import Player
+from nightfall.core.state.game_state import GameState
+
+# Buildings that can be placed on a generated city (the Citadel is placed by CityMap itself)
+BUILDABLE_TYPES = [b for b in BuildingType if b != BuildingType.CITADEL]
+
+
+@dataclass
+class WorldConfig:
+    """Shape of a synthetic world."""
+    players: int = 4
+    cities_per_player: int = 2
+    city_width: int = 15
+    city_height: int = 15
+    building_density: float = 0.3 # Fraction of city tiles that hold a building
+    queue_length: int = 20 # Queued actions per player
+    world_width: int = 64
+    world_height: int = 64
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _generate_game_map(config: WorldConfig, rng: random.Random) -> GameMap:
+    terrains = list(TerrainType)
+    terrain = bytes(rng.choice(terrains).value for _ in range(config.world_width * config.world_height))
+    return GameMap(config.world_width, config.world_height, terrain)
+
+
+def _generate_city_map(config: WorldConfig, rng: random.Random) -> CityMap:
+    city_map = CityMap(config.city_width, config.city_height)
+    terrains = list(CityTerrainType)
+    for x in range(config.city_width):
+        for y in range(config.city_height):
+            tile = city_map.get_tile(x, y)
+            tile.terrain = rng.choice(terrains)
+            if tile.building is None and rng.random() < config.building_density:
+                building_type = rng.choice(BUILDABLE_TYPES)
+                max_level = max(BUILDING_DATA[building_type].get('upgrade', {1: None}))
+                tile.building = Building(building_type, rng.randint(1, max_level))
+    return city_map
+
+
+def _generate_queue(config: WorldConfig, rng: random.Random, player_id: str, city_ids: List[str]) -> List[Action]:
+    queue = []
+    for _ in range(config.queue_length):
+        city_id = rng.choice(city_ids)
+        position = Position(rng.randrange(config.city_width), rng.randrange(config.city_height))
+        roll = rng.random()
+        if roll < 0.5:
+            queue.append(BuildBuildingAction(player_id, city_id, position, rng.choice(BUILDABLE_TYPES)))
+        elif roll < 0.85:
+            queue.append(UpgradeBuildingAction(player_id, city_id, position))
+        else:
+            queue.append(DemolishAction(player_id, city_id, position))
+    return queue
+
+
+def generate_world(config: WorldConfig) -> GameState:
+    """Builds a GameState with the given number of players, cities and queued actions."""
+    rng = random.Random(config.seed)
+    game_map = _generate_game_map(config, rng)
+    players = {}
+    cities = {}
+
+    for p in range(config.players):
+        player_id = f"player{p + 1}"
+        city_ids = []
+        for c in range(config.cities_per_player):
+            city_id = f"{player_id}_city{c + 1}"
+            position = Position(rng.randrange(config.world_width), rng.randrange(config.world_height))
+            cities[city_id] = City(
+                id=city_id,
+                name=f"City {p + 1}-{c + 1}",
+                owner_id=player_id,
+                position=position,
+                city_map=_generate_city_map(config, rng),
+                resources=Resources(food=100000, wood=100000, iron=100000)
+            )
+            city_ids.append(city_id)
+        players[player_id] = Player(player_id, city_ids, _generate_queue(config, rng, player_id, city_ids))
+
+    return GameState(game_map, players, cities, turn=0)
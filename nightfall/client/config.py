@@ -2,8 +2,13 @@
 Central configuration for the client.
 Stores constants to avoid circular imports.
 """
+import os
 
 # For now, we are hardcoding the active player and city.
 # In a multiplayer client, these would be determined after login.
 PLAYER_ID = "player1"
 CITY_ID = "city1"
+
+# World maps received from servers are cached here, keyed by their content hash,
+# so joining another session on the same map does not download it again.
+MAP_CACHE_DIR = os.environ.get("NIGHTFALL_MAP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".nightfall", "maps"))
@@ -4,9 +4,14 @@ from nightfall.client.network_client import NetworkClient
 from nightfall.client.renderer import Renderer
 from nightfall.client.input_handler import InputHandler
 from nightfall.client.ui_manager import DEFAULT_SCREEN_WIDTH, DEFAULT_SCREEN_HEIGHT, UIManager
-from nightfall.client.config import PLAYER_ID, CITY_ID
+from nightfall.client.config import PLAYER_ID, CITY_ID, MAP_CACHE_DIR
+from nightfall.client.map_cache import MapCache
+from nightfall.core.components.map import GameMap
 from nightfall.core.state.game_state import GameState
+from nightfall.core.state.delta import apply_action_queues, apply_patch
 from nightfall.core.engine.simulator import Simulator
+from nightfall.core.engine.prediction import PredictionCache
+from nightfall.core.engine.turn_report import TurnReport
 
 class GameClient:
     def __init__(self, host, port):
@@ -23,12 +28,18 @@ class GameClient:
         
         # Game State Management
         self.server_state: GameState | None = None
+        self.server_state_version: int | None = None # Base version for the server's state patches
+        self.pending_state_message: dict | None = None # State message waiting for its world map
         self.predicted_state: GameState | None = None
         self.action_queue = []
+        self.last_turn_report: TurnReport | None = None
 
         # Networking and Simulation
         self.network_client = NetworkClient()
         self.simulator = Simulator()
+        # Orders run after the next turn's AP refill; the server validates them the same way
+        self.prediction_cache = PredictionCache(PLAYER_ID, refill_action_points=True)
+        self.map_cache = MapCache(MAP_CACHE_DIR)
 
         # Components
         self.ui_manager = UIManager()
@@ -80,28 +91,67 @@ class GameClient:
             payload = message.get("payload")
 
             if msg_type == "initial_state" or msg_type == "state_update":
-                # The server is now the source of truth for the action queue on state updates
-                player_data = payload.get('players', {}).get(PLAYER_ID, {})
-                action_data = player_data.get('action_queue', [])
-                
-                self.server_state = GameState.from_dict(payload)
-                self.action_queue = self.server_state.players[PLAYER_ID].action_queue
-                self.client_state = "IN_GAME"
-                self.ui_manager.clear_lobby_buttons() # Clean up lobby UI state
-                # After receiving a new state, we must re-predict to see the effects of the queue.
-                self._repredict_state()
-                self.status_message = f"Turn: {self.server_state.turn}"
+                self._load_server_state(message)
+            elif msg_type == "map":
+                game_map = GameMap.from_dict(payload['game_map'])
+                if game_map.content_hash() != payload.get('hash'):
+                    print(f"[CLIENT] Received a map that does not match hash {payload.get('hash')}.")
+                    continue
+                self.map_cache.put(game_map)
+                if self.pending_state_message is not None:
+                    pending, self.pending_state_message = self.pending_state_message, None
+                    self._load_server_state(pending)
+            elif msg_type == "state_patch":
+                if self.server_state is None or payload.get('base_version') != self.server_state_version:
+                    # We missed an update; the patch does not apply to what we have.
+                    self.network_client.send_message({"command": "resync", "player_id": PLAYER_ID})
+                    continue
+                apply_patch(self.server_state, payload)
+                self.server_state_version = payload['version']
+                apply_action_queues(self.server_state, message.get('action_queues', {}))
+                self._on_server_state_changed()
             elif msg_type == "ack":
                 print(f"[CLIENT] Received ACK from server: {payload.get('message')}")
                 self.status_message = payload.get('message', self.status_message)
             elif msg_type == "error":
                 print(f"[CLIENT] Received ERROR from server: {payload.get('message')}")
                 self.status_message = f"Error: {payload.get('message')}"
+            elif msg_type == "turn_report":
+                report = TurnReport.from_dict(payload)
+                self.last_turn_report = report
+                print(f"[CLIENT] Turn {report.turn} report: {report.succeeded} actions succeeded, {report.failed} failed.")
             elif msg_type == "session_list":
                 self.available_sessions = payload
                 self.ui_manager.update_lobby_buttons(self.available_sessions)
 
 
+    def _load_server_state(self, message: dict):
+        """Replaces the server state with a full state message, fetching its world map if we do not have it."""
+        payload = message['payload']
+        map_ref = payload.get('game_map', {})
+        game_map = None
+        if 'hash' in map_ref:
+            game_map = self.map_cache.get(map_ref['hash'])
+            if game_map is None:
+                # Keep the message until the server sends the map
+                self.pending_state_message = message
+                self.network_client.send_message({"command": "get_map", "player_id": PLAYER_ID, "payload": {"hash": map_ref['hash']}})
+                return
+        self.server_state = GameState.from_dict(payload, game_map=game_map)
+        self.server_state_version = payload.get('version')
+        apply_action_queues(self.server_state, message.get('action_queues', {}))
+        self._on_server_state_changed()
+
+    def _on_server_state_changed(self):
+        # The server is now the source of truth for the action queue on state updates
+        self.action_queue = self.server_state.players[PLAYER_ID].action_queue
+        self.prediction_cache.reset(self.server_state) # Cached prefixes belong to the old state
+        self.client_state = "IN_GAME"
+        self.ui_manager.clear_lobby_buttons() # Clean up lobby UI state
+        # After receiving a new state, we must re-predict to see the effects of the queue.
+        self._repredict_state()
+        self.status_message = f"Turn: {self.server_state.turn}"
+
     def _handle_client_action(self, action: dict):
         """Handle actions generated by the InputHandler."""
         action_type = action.get("type")
@@ -131,17 +181,23 @@ class GameClient:
         self._repredict_state()
 
     def _repredict_state(self):
-        """Recalculate the predicted state from the last known server state."""
+        """
+        Recalculate the predicted state from the last known server state.
+        Only the actions after the unchanged part of the queue are simulated again.
+        """
         if self.server_state:
-            self.predicted_state = self.simulator.predict_outcome(
-                self.server_state, self.action_queue, PLAYER_ID
-            )
+            self.predicted_state = self.prediction_cache.predict(self.action_queue)
+            # Verdicts let the queue panel grey out actions that would fail
+            self.ui_manager.queue_verdicts = self.prediction_cache.results
     
     def _return_to_lobby(self):
         """Resets client state to return to the lobby view."""
         self.client_state = "LOBBY"
         self.server_state = None
+        self.server_state_version = None
+        self.pending_state_message = None
         self.predicted_state = None
+        self.prediction_cache.reset(None)
         self.action_queue.clear()
         self.status_message = "Welcome to the Lobby"
 
@@ -152,10 +208,8 @@ class GameClient:
 
         city = self.predicted_state.players[PLAYER_ID].get_city(CITY_ID, self.predicted_state.cities)
         if city:
-            # Correctly pass the full predicted state to the calculator
-            self.ui_manager.predicted_production = self.simulator.calculate_resource_production(
-                self.predicted_state, city
-            )
+            # The city keeps its production total up to date, so this is cheap every frame
+            self.ui_manager.predicted_production = city.production
         
         self.ui_manager.update_action_queue_ui(self.action_queue)
 
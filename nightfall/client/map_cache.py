@@ -0,0 +1,45 @@
+import json
+import os
+from typing import Dict, Optional
+from nightfall.core.components.map import GameMap
+
+class MapCache:
+    """
+    World maps keyed by content hash, kept in memory and in a directory on disk.
+    Files that fail to load or do not match their hash are ignored.
+    """
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.maps: Dict[str, GameMap] = {}
+
+    def _path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}.json")
+
+    def get(self, content_hash: str) -> Optional[GameMap]:
+        game_map = self.maps.get(content_hash)
+        if game_map is not None or not self.directory:
+            return game_map
+        try:
+            with open(self._path(content_hash), 'r') as f:
+                game_map = GameMap.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+        if game_map.content_hash() != content_hash:
+            return None
+        self.maps[content_hash] = game_map
+        return game_map
+
+    def put(self, game_map: GameMap):
+        content_hash = game_map.content_hash()
+        self.maps[content_hash] = game_map
+        if not self.directory:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves a truncated map behind
+            temp_path = self._path(content_hash) + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(game_map.to_dict(map_format='compact'), f)
+            os.replace(temp_path, self._path(content_hash))
+        except OSError as e:
+            print(f"Could not cache map {content_hash}: {e}")
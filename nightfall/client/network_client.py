@@ -1,21 +1,35 @@
 import socket
-import json
 import threading
 import queue
+from typing import List
+from nightfall.core.protocol.codec import CODECS, FEATURES, HELLO_COMMAND, JSON_CODEC
+
+# Seconds to wait for the server to answer 'hello'. Servers that predate codec
+# negotiation never answer, and the connection stays on JSON.
+HELLO_TIMEOUT = 2.0
 
 class NetworkClient:
     """Handles threaded, non-blocking communication with the server."""
-    def __init__(self):
+    def __init__(self, codecs: List[str] = None, features: List[str] = None):
         self.sock = None
+        self.reader = None
         self.incoming_queue = queue.Queue()
         self.is_connected = False
+        # Codecs offered to the server, in order of preference
+        self.offered_codecs = codecs if codecs is not None else list(CODECS)
+        self.codec = JSON_CODEC
+        # Optional protocol features requested from the server, and those it accepted
+        self.offered_features = features if features is not None else list(FEATURES)
+        self.features = set()
 
     def connect(self, host="localhost", port=9999):
         try:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.connect((host, port))
+            self.reader = self.sock.makefile('rb')
             self.is_connected = True
-            
+            self._negotiate_codec()
+
             # Start a daemon thread to listen for messages from the server
             self.listen_thread = threading.Thread(target=self._listen_for_messages, daemon=True)
             self.listen_thread.start()
@@ -24,17 +38,36 @@ class NetworkClient:
             print("Connection failed. Is the server running?")
             self.is_connected = False
 
+    def _negotiate_codec(self):
+        """Offers our codecs and features to the server and switches to the codec it picks."""
+        self.codec = JSON_CODEC
+        self.features = set()
+        if self.offered_codecs in ([], [JSON_CODEC.name]) and not self.offered_features:
+            return
+        self.send_message({"command": HELLO_COMMAND, "payload": {"codecs": self.offered_codecs, "features": self.offered_features}})
+        self.sock.settimeout(HELLO_TIMEOUT)
+        try:
+            reply = JSON_CODEC.read_message(self.reader)
+        except socket.timeout:
+            print("Server did not answer the codec negotiation; using JSON.")
+            # The timed out read leaves the buffered reader unusable
+            self.reader = self.sock.makefile('rb')
+            reply = None
+        finally:
+            self.sock.settimeout(None)
+        if reply and reply.get("type") == "hello":
+            self.codec = CODECS.get(reply["payload"].get("codec"), JSON_CODEC)
+            self.features = set(reply["payload"].get("features", []))
+
     def _listen_for_messages(self):
         """Worker thread function to read data from the server."""
-        f = self.sock.makefile('r')
         while self.is_connected and self.sock:
             try:
-                line = f.readline()
-                if not line:
+                data = self.codec.read_message(self.reader)
+                if data is None:
                     break  # Server closed connection
-                data = json.loads(line)
                 self.incoming_queue.put(data)
-            except (OSError, json.JSONDecodeError):
+            except (OSError, ValueError):
                 if self.is_connected: break # Only break if we weren't expecting to close
         self.is_connected = False
         print("Disconnected from server.")
@@ -47,11 +80,10 @@ class NetworkClient:
             return None
 
     def send_message(self, data: dict):
-        """Sends a JSON-encoded message to the server."""
+        """Sends a message to the server with the negotiated codec."""
         if self.is_connected:
             try:
-                message = json.dumps(data)
-                self.sock.sendall(message.encode('utf-8') + b'\n')
+                self.sock.sendall(self.codec.frame(data))
             except OSError:
                 self.is_connected = False
 
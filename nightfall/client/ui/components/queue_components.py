@@ -11,6 +11,7 @@ if TYPE_CHECKING:
 # Colors
 C_BLACK, C_WHITE, C_RED = (0,0,0), (255,255,255), (200,0,0)
 C_BLUE, C_DARK_GRAY, C_LIGHT_GRAY = (65,105,225), (30,30,30), (150,150,150)
+C_MID_GRAY, C_DIM_GRAY = (90,90,90), (60,60,60)
 
 class BuildQueueComponent(BaseComponent):
     def __init__(self, ui_manager: "UIManager"):
@@ -67,8 +68,11 @@ class BuildQueueComponent(BaseComponent):
         for i, action in enumerate(visible_actions):
             absolute_index = start_index + i
             item_rect = ui_manager.get_build_queue_item_rect(i)
-            pygame.draw.rect(screen, C_LIGHT_GRAY, item_rect, border_radius=5)
-            screen.blit(self.font_s.render(f"{absolute_index + 1}. {str(action)}", True, C_BLACK), (item_rect.x + 5, item_rect.y + 2))
+            # Grey out actions that are expected to fail
+            verdicts = ui_manager.queue_verdicts
+            will_fail = absolute_index < len(verdicts) and not verdicts[absolute_index]
+            pygame.draw.rect(screen, C_MID_GRAY if will_fail else C_LIGHT_GRAY, item_rect, border_radius=5)
+            screen.blit(self.font_s.render(f"{absolute_index + 1}. {str(action)}", True, C_DIM_GRAY if will_fail else C_BLACK), (item_rect.x + 5, item_rect.y + 2))
             
             x_rect = ui_manager.get_build_queue_item_remove_button_rect(i)
             if ui_manager.hovered_remove_button_index == i:
@@ -63,6 +63,7 @@ class UIManager:
         self.queue_item_rects = []
         self.queue_item_remove_button_rects = []
         self.hovered_remove_button_index: Optional[int] = None
+        self.queue_verdicts = [] # One ActionResult per queued action, from the PredictionCache
         self.predicted_production = None
 
         # --- Scroll State ---
@@ -1,4 +1,9 @@
+import os
 from pathlib import Path
 
 
-PROJECT_ROOT = Path(__file__).resolve().parent.parent
\ No newline at end of file
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# When enabled, every incremental production update is checked against a full
+# recompute of the city. Slow; meant for development and debugging only.
+DEBUG_PRODUCTION = os.environ.get("NIGHTFALL_DEBUG_PRODUCTION", "0") == "1"
@@ -1,4 +1,35 @@
+import logging
 from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Optional
+from nightfall.core.common.datatypes import Resources
+from nightfall.core.common.enums import ActionFailure
+
+# Action outcomes are logged at DEBUG level, so they cost nothing unless a
+# handler is configured for this logger at that level.
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ActionResult:
+    """
+    The outcome of executing an action. Truthy if the action succeeded.
+    The deltas are the changes applied to the city (negative for costs).
+    """
+    success: bool
+    failure: Optional[ActionFailure] = None
+    resource_delta: Resources = field(default_factory=Resources)
+    ap_delta: int = 0
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def to_dict(self) -> dict:
+        return {
+            'success': self.success,
+            'failure': self.failure.name if self.failure else None,
+            'resource_delta': self.resource_delta.__dict__,
+            'ap_delta': self.ap_delta
+        }
 
 class Action(ABC):
     """Abstract base class for all player actions (Command Pattern)."""
@@ -7,10 +38,20 @@ class Action(ABC):
         self.city_id = city_id
 
     @abstractmethod
-    def execute(self, game_state) -> bool:
-        """Executes the action, modifying the game state. Returns True if successful."""
+    def execute(self, game_state) -> ActionResult:
+        """Executes the action, modifying the game state. Returns the outcome."""
         pass
 
+    def _fail(self, failure: ActionFailure, message: str, *args) -> ActionResult:
+        """Builds a failed result, logging `message % args` at DEBUG level."""
+        logger.debug("[ACTION FAILED] " + message, *args)
+        return ActionResult(False, failure)
+
+    def _succeed(self, cost: Resources, ap_cost: int, message: str, *args) -> ActionResult:
+        """Builds a successful result for an action that spent `cost` and `ap_cost`."""
+        logger.debug("[ACTION SUCCESS] " + message, *args)
+        return ActionResult(True, None, Resources() - cost, -ap_cost)
+
     @classmethod
     def from_dict(cls, data: dict, action_class_map: dict) -> 'Action':
         """
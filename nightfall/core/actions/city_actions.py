@@ -1,6 +1,6 @@
-from nightfall.core.actions.action import Action
-from nightfall.core.common.datatypes import Position
-from nightfall.core.common.enums import BuildingType, CityTerrainType, UnitType
+from nightfall.core.actions.action import Action, ActionResult
+from nightfall.core.common.datatypes import Position, RecruitmentProgress, Resources
+from nightfall.core.common.enums import ActionFailure, BuildingType, CityTerrainType, UnitType
 from nightfall.core.common.game_data import BUILDING_DATA, UNIT_DATA, DEMOLISH_COST_BUILDING, DEMOLISH_COST_RESOURCE
 from nightfall.core.components.city import Building
 
@@ -31,44 +31,42 @@ class BuildBuildingAction(Action):
             building_type=BuildingType(data['building_type'])
         )
 
-    def execute(self, game_state: 'GameState') -> bool:
+    def execute(self, game_state: 'GameState') -> ActionResult:
         player = game_state.players.get(self.player_id)
         city = player.get_city(self.city_id, game_state.cities) if player else None
         
         if not city:
-            print(f"[ACTION FAILED] City '{self.city_id}' not found for player '{self.player_id}'.")
-            return False
+            return self._fail(ActionFailure.CITY_NOT_FOUND, "City '%s' not found for player '%s'.", self.city_id, self.player_id)
             
         tile = city.city_map.get_tile(self.position.x, self.position.y)
+        if not tile:
+            return self._fail(ActionFailure.INVALID_POSITION, "Position %s is outside the city.", self.position)
         
         # Correctly access the build cost
         build_data = BUILDING_DATA.get(self.building_type, {}).get('build', {})
         ap_cost = BUILDING_DATA.get(self.building_type, {}).get('action_point_cost', 1)
         if 'cost' not in build_data:
-            print(f"[ACTION FAILED] No build cost defined for {self.building_type.value}.")
-            return False
+            return self._fail(ActionFailure.NO_BUILD_COST, "No build cost defined for %s.", self.building_type.value)
         cost = build_data['cost']
 
         # --- Validation ---
         if city.action_points < ap_cost:
-            print(f"[ACTION FAILED] Not enough Action Points to build (needs {ap_cost}).")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_ACTION_POINTS, "Not enough Action Points to build (needs %s).", ap_cost)
         if city.num_buildings >= city.max_buildings:
-            print(f"[ACTION FAILED] City is at its maximum building limit ({city.max_buildings}).")
-            return False
+            return self._fail(ActionFailure.BUILDING_LIMIT_REACHED, "City is at its maximum building limit (%s).", city.max_buildings)
         if tile.building:
-            print(f"[ACTION FAILED] Tile at {self.position} already has a building.")
-            return False
+            return self._fail(ActionFailure.TILE_OCCUPIED, "Tile at %s already has a building.", self.position)
         if not city.resources.can_afford(cost):
-            print(f"[ACTION FAILED] Not enough resources to build {self.building_type.value}.")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_RESOURCES, "Not enough resources to build %s.", self.building_type.value)
         
         # --- Execution ---
         city.action_points -= ap_cost
         city.resources -= cost
+        tile = city.city_map.get_tile_for_update(self.position.x, self.position.y)
         tile.building = Building(self.building_type, 1)
-        print(f"[ACTION SUCCESS] Built {self.building_type.value} at {self.position}.")
-        return True
+        city.num_buildings += 1
+        city.refresh_production_around(self.position)
+        return self._succeed(cost, ap_cost, "Built %s at %s.", self.building_type.value, self.position)
 
 
 class UpgradeBuildingAction(Action):
@@ -95,19 +93,17 @@ class UpgradeBuildingAction(Action):
             position=Position(**data['position'])
         )
 
-    def execute(self, game_state: 'GameState') -> bool:
+    def execute(self, game_state: 'GameState') -> ActionResult:
         player = game_state.players.get(self.player_id)
         city = player.get_city(self.city_id, game_state.cities) if player else None
         
         if not city:
-            print(f"[ACTION FAILED] City '{self.city_id}' not found for player '{self.player_id}'.")
-            return False
+            return self._fail(ActionFailure.CITY_NOT_FOUND, "City '%s' not found for player '%s'.", self.city_id, self.player_id)
 
         tile = city.city_map.get_tile(self.position.x, self.position.y)
         
         if not tile or not tile.building:
-            print(f"[ACTION FAILED] No building to upgrade at {self.position}.")
-            return False
+            return self._fail(ActionFailure.NO_BUILDING, "No building to upgrade at %s.", self.position)
             
         building = tile.building
         building_data = BUILDING_DATA[building.type]
@@ -116,24 +112,22 @@ class UpgradeBuildingAction(Action):
         # --- Validation ---
         ap_cost = building_data.get('action_point_cost', 1)
         if city.action_points < ap_cost:
-            print(f"[ACTION FAILED] Not enough Action Points to upgrade (needs {ap_cost}).")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_ACTION_POINTS, "Not enough Action Points to upgrade (needs %s).", ap_cost)
         if 'upgrade' not in building_data or next_level not in building_data['upgrade']:
-            print(f"[ACTION FAILED] Building at {self.position} is at max level.")
-            return False
+            return self._fail(ActionFailure.MAX_LEVEL_REACHED, "Building at %s is at max level.", self.position)
         
         cost = building_data['upgrade'][next_level]['cost']
 
         if not city.resources.can_afford(cost):
-            print(f"[ACTION FAILED] Not enough resources to upgrade {building.type.value}.")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_RESOURCES, "Not enough resources to upgrade %s.", building.type.value)
 
         # --- Execution ---
         city.action_points -= ap_cost
         city.resources -= cost
+        building = city.city_map.get_tile_for_update(self.position.x, self.position.y).building
         building.level = next_level
-        print(f"[ACTION SUCCESS] Upgraded {building.type.value} at {self.position} to level {next_level}.")
-        return True
+        city.refresh_production_around(self.position)
+        return self._succeed(cost, ap_cost, "Upgraded %s at %s to level %s.", building.type.value, self.position, next_level)
 
 
 class DemolishAction(Action):
@@ -160,13 +154,12 @@ class DemolishAction(Action):
             position=Position(**data['position'])
         )
 
-    def execute(self, game_state: 'GameState') -> bool:
+    def execute(self, game_state: 'GameState') -> ActionResult:
         player = game_state.players.get(self.player_id)
         city = player.get_city(self.city_id, game_state.cities) if player else None
         
         if not city:
-            print(f"[ACTION FAILED] City '{self.city_id}' not found for player '{self.player_id}'.")
-            return False
+            return self._fail(ActionFailure.CITY_NOT_FOUND, "City '%s' not found for player '%s'.", self.city_id, self.player_id)
 
         tile = city.city_map.get_tile(self.position.x, self.position.y)
         
@@ -174,8 +167,7 @@ class DemolishAction(Action):
         can_demolish_plot = tile and tile.terrain in [CityTerrainType.FOREST_PLOT, CityTerrainType.IRON_DEPOSIT]
 
         if not (can_demolish_building or can_demolish_plot):
-            print(f"[ACTION FAILED] Nothing to demolish at {self.position}.")
-            return False
+            return self._fail(ActionFailure.NOTHING_TO_DEMOLISH, "Nothing to demolish at %s.", self.position)
 
         # Determine the correct cost based on what is being demolished
         demolish_data = DEMOLISH_COST_BUILDING if can_demolish_building else DEMOLISH_COST_RESOURCE
@@ -184,23 +176,24 @@ class DemolishAction(Action):
 
         # --- Validation ---
         if city.action_points < ap_cost:
-            print(f"[ACTION FAILED] Not enough Action Points to demolish (needs {ap_cost}).")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_ACTION_POINTS, "Not enough Action Points to demolish (needs %s).", ap_cost)
         if not city.resources.can_afford(cost):
-            print(f"[ACTION FAILED] Not enough resources to demolish.")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_RESOURCES, "Not enough resources to demolish.")
 
         city.action_points -= ap_cost
         city.resources -= cost
+        tile = city.city_map.get_tile_for_update(self.position.x, self.position.y)
 
         if can_demolish_building:
             tile.building = None
-            print(f"[ACTION SUCCESS] Demolished building at {self.position}.")
+            city.num_buildings -= 1
+            message = "Demolished building at %s."
         elif can_demolish_plot:
             tile.terrain = CityTerrainType.GRASS
-            print(f"[ACTION SUCCESS] Cleared plot at {self.position}, turning it to grass.")
+            message = "Cleared plot at %s, turning it to grass."
 
-        return True
+        city.refresh_production_around(self.position)
+        return self._succeed(cost, ap_cost, message, self.position)
 
 
 class RecruitUnitAction(Action):
@@ -230,18 +223,16 @@ class RecruitUnitAction(Action):
             quantity=data['quantity']
         )
 
-    def execute(self, game_state: 'GameState') -> bool:
+    def execute(self, game_state: 'GameState') -> ActionResult:
         player = game_state.players.get(self.player_id)
         city = player.get_city(self.city_id, game_state.cities) if player else None
         
         if not city:
-            print(f"[ACTION FAILED] City '{self.city_id}' not found for player '{self.player_id}'.")
-            return False
+            return self._fail(ActionFailure.CITY_NOT_FOUND, "City '%s' not found for player '%s'.", self.city_id, self.player_id)
 
         unit_data = UNIT_DATA.get(self.unit_type)
         if not unit_data:
-            print(f"[ACTION FAILED] Unit type {self.unit_type} not found in game data.")
-            return False
+            return self._fail(ActionFailure.UNKNOWN_UNIT_TYPE, "Unit type %s not found in game data.", self.unit_type)
 
         total_cost = Resources(
             food=unit_data['cost'].food * self.quantity,
@@ -251,14 +242,11 @@ class RecruitUnitAction(Action):
         ap_cost = unit_data['action_point_cost']
 
         if city.action_points < ap_cost:
-            print(f"[ACTION FAILED] Not enough Action Points to start recruitment (needs {ap_cost}).")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_ACTION_POINTS, "Not enough Action Points to start recruitment (needs %s).", ap_cost)
         if not city.resources.can_afford(total_cost):
-            print(f"[ACTION FAILED] Not enough resources to recruit {self.quantity} {self.unit_type.name.title()}.")
-            return False
+            return self._fail(ActionFailure.NOT_ENOUGH_RESOURCES, "Not enough resources to recruit %s %s.", self.quantity, self.unit_type.name.title())
 
         city.action_points -= ap_cost
         city.resources -= total_cost
-        city.recruitment_queue.append(self)
-        print(f"[ACTION SUCCESS] Queued recruitment of {self.quantity} {self.unit_type.name.title()}.")
-        return True
+        city.recruitment_queue.append(RecruitmentProgress(self.unit_type, self.quantity))
+        return self._succeed(total_cost, ap_cost, "Queued recruitment of %s %s.", self.quantity, self.unit_type.name.title())
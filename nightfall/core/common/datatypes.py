@@ -1,5 +1,6 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from array import array
+from dataclasses import dataclass, field
 
 from nightfall.core.common.enums import UnitType
 
@@ -45,6 +46,33 @@ class Resources:
         """
         return self.food >= cost.food and self.wood >= cost.wood and self.iron >= cost.iron
 
+@dataclass
+class ResourceTrajectory:
+    """Per-turn resource stockpiles of one city, stored as compact integer arrays."""
+    food: array = field(default_factory=lambda: array('q'))
+    wood: array = field(default_factory=lambda: array('q'))
+    iron: array = field(default_factory=lambda: array('q'))
+
+    def append(self, resources: Resources):
+        self.food.append(resources.food)
+        self.wood.append(resources.wood)
+        self.iron.append(resources.iron)
+
+    def extend_linear(self, start: Resources, delta: Resources, turns: int):
+        """Appends `turns` entries growing from `start` by `delta` each turn (start itself excluded)."""
+        for values, first, step in (
+            (self.food, start.food, delta.food),
+            (self.wood, start.wood, delta.wood),
+            (self.iron, start.iron, delta.iron),
+        ):
+            if step:
+                values.extend(range(first + step, first + step * turns + step, step))
+            else:
+                values.extend([first] * turns)
+
+    def __len__(self) -> int:
+        return len(self.food)
+
 @dataclass
 class RecruitmentProgress:
     """Tracks the progress of a single unit recruitment batch."""
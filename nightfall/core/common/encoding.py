@@ -0,0 +1,41 @@
+"""
+Text encodings for terrain grids.
+
+Grids of enum codes are written as strings with one character per cell (the
+letters of the maps' TERRAIN_MAPPING), optionally run-length encoded as
+``<count><char>`` runs where a count of 1 is omitted, e.g. ``"12G3FW"``.
+"""
+import re
+from typing import Mapping, Tuple
+from enum import Enum
+
+_REPEATS = re.compile(r'(.)\1*', re.DOTALL)
+_RUN = re.compile(r'(\d*)(\D)')
+
+
+def char_tables(mapping: Mapping[str, Enum], default: Enum) -> Tuple[bytes, bytes]:
+    """
+    Returns (code_by_char, char_by_code) tables for bytes.translate, converting
+    between single-character terrain letters and enum codes. Unknown characters
+    become `default`, and unknown codes become its letter.
+    """
+    default_char = next(char for char, value in mapping.items() if value == default)
+    code_by_char = bytearray([default.value]) * 256
+    char_by_code = bytearray(default_char.encode('ascii')) * 256
+    for char, value in mapping.items():
+        code_by_char[ord(char)] = value.value
+        char_by_code[value.value] = ord(char)
+    return bytes(code_by_char), bytes(char_by_code)
+
+
+def rle_encode(text: str) -> str:
+    """Run-length encodes a string of non-digit characters."""
+    return ''.join(
+        f"{len(run)}{run[0]}" if len(run) > 1 else run
+        for run in (match.group() for match in _REPEATS.finditer(text))
+    )
+
+
+def rle_decode(text: str) -> str:
+    """Inverse of rle_encode."""
+    return ''.join(char * (int(count) if count else 1) for count, char in _RUN.findall(text))
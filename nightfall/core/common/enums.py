@@ -31,3 +31,17 @@ class CityTerrainType(Enum):
 class UnitType(Enum):
     """Enumeration for unit types."""
     SWORDSMAN = auto()
+
+class ActionFailure(Enum):
+    """Enumeration for the reasons an action can fail."""
+    CITY_NOT_FOUND = auto()
+    INVALID_POSITION = auto()
+    NO_BUILD_COST = auto()
+    NOT_ENOUGH_ACTION_POINTS = auto()
+    BUILDING_LIMIT_REACHED = auto()
+    TILE_OCCUPIED = auto()
+    NOT_ENOUGH_RESOURCES = auto()
+    NO_BUILDING = auto()
+    MAX_LEVEL_REACHED = auto()
+    NOTHING_TO_DEMOLISH = auto()
+    UNKNOWN_UNIT_TYPE = auto()
@@ -1,10 +1,16 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import List, Optional
+import copy
+import hashlib
+from typing import Dict, Iterator, List, Optional, Tuple
+from nightfall.config import DEBUG_PRODUCTION
 from nightfall.core.actions.action import Action
 from nightfall.core.common.datatypes import Position, Resources, RecruitmentProgress
+from nightfall.core.common.encoding import char_tables, rle_decode, rle_encode
 from nightfall.core.common.enums import BuildingType, CityTerrainType, UnitType
 from nightfall.core.common.game_data import BUILDING_DATA
+from nightfall.core.engine.production import NEIGHBOR_OFFSETS, city_production, tile_production
+
 
 @dataclass
 class Building:
@@ -24,7 +30,7 @@ class Building:
 
 @dataclass
 class CityTile:
-    """Represents a single tile within a city's grid."""
+    """A single city tile detached from any map."""
     terrain: CityTerrainType
     position: Position
     building: Optional[Building] = None
@@ -51,8 +57,87 @@ class CityTile:
             Building.from_dict(data['building']) if data.get('building') else None
         )
 
+class BuildingView:
+    """The building on a tile of a CityMap. Reads and writes go straight to the map's grids."""
+    __slots__ = ('_city_map', '_index')
+
+    def __init__(self, city_map: CityMap, index: int):
+        self._city_map = city_map
+        self._index = index
+
+    @property
+    def type(self) -> BuildingType:
+        return _BUILDING_BY_CODE[self._city_map._building_types[self._index]]
+
+    @property
+    def level(self) -> int:
+        return self._city_map._levels[self._index]
+
+    @level.setter
+    def level(self, level: int):
+        self._city_map._make_writable()
+        self._city_map._levels[self._index] = level
+
+    def deep_copy(self) -> Building:
+        return Building(self.type, self.level)
+
+    def to_dict(self) -> dict:
+        return {'type': self.type.name, 'level': self.level}
+
+class CityTileView:
+    """
+    A tile of a CityMap. It has the same attributes as CityTile, but holds no
+    state of its own: every read and write goes to the map's grids.
+    """
+    __slots__ = ('_city_map', '_index', 'position')
+
+    def __init__(self, city_map: CityMap, index: int, position: Position):
+        self._city_map = city_map
+        self._index = index
+        self.position = position
+
+    @property
+    def terrain(self) -> CityTerrainType:
+        return _TERRAIN_BY_CODE[self._city_map._terrain[self._index]]
+
+    @terrain.setter
+    def terrain(self, terrain: CityTerrainType):
+        self._city_map._make_writable()
+        self._city_map._terrain[self._index] = terrain.value
+
+    @property
+    def building(self) -> Optional[BuildingView]:
+        if not self._city_map._building_types[self._index]:
+            return None
+        return BuildingView(self._city_map, self._index)
+
+    @building.setter
+    def building(self, building):
+        self._city_map._make_writable()
+        self._city_map._building_types[self._index] = building.type.value if building else 0
+        self._city_map._levels[self._index] = building.level if building else 0
+
+    def deep_copy(self) -> CityTile:
+        building = self.building
+        return CityTile(self.terrain, self.position, building.deep_copy() if building else None)
+
+    def to_dict(self) -> dict:
+        building = self.building
+        return {
+            'terrain': self.terrain.name,
+            'position': self.position.__dict__,
+            'building': building.to_dict() if building else None
+        }
+
 class CityMap:
-    """Represents the grid of tiles within a city."""
+    """
+    Represents the grid of tiles within a city.
+
+    Terrain, building type and building level are stored as three byte grids
+    in x-major order (index ``x * height + y``), so copying, hashing or
+    serializing a map works on whole buffers. `get_tile` returns a CityTileView
+    onto the grids.
+    """
     TERRAIN_MAPPING = {
         'G': CityTerrainType.GRASS,
         'F': CityTerrainType.FOREST_PLOT,
@@ -64,23 +149,127 @@ class CityMap:
         self.width = width
         self.height = height
         # First, create the grid with default grass tiles
-        self.tiles: List[List[CityTile]] = [
-            [CityTile(terrain=CityTerrainType.GRASS, position=Position(x, y)) for y in range(height)]
-            for x in range(width)
-        ]
-        # Then, place the Citadel on the newly created central tile
-        citadel_pos = Position(width // 2, height // 2)
-        self.get_tile(citadel_pos.x, citadel_pos.y).building = Building(BuildingType.CITADEL, 1)
-
-    def get_tile(self, x: int, y: int) -> Optional[CityTile]:
+        self._terrain = bytearray([CityTerrainType.GRASS.value]) * (width * height)
+        self._building_types = bytearray(width * height)
+        self._levels = bytearray(width * height)
+        # Copy-on-write bookkeeping; True while the grids are shared with another map.
+        self._shared = False
+        # Then, place the Citadel on the central tile
+        self.get_tile(width // 2, height // 2).building = Building(BuildingType.CITADEL, 1)
+
+    @classmethod
+    def _from_grids(cls, width: int, height: int, terrain: bytearray, building_types: bytearray,
+                    levels: bytearray, shared: bool = False) -> CityMap:
+        city_map = cls.__new__(cls)
+        city_map.width = width
+        city_map.height = height
+        city_map._terrain = terrain
+        city_map._building_types = building_types
+        city_map._levels = levels
+        city_map._shared = shared
+        return city_map
+
+    def _index(self, x: int, y: int) -> Optional[int]:
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.tiles[x][y]
+            return x * self.height + y
         return None
 
+    def _make_writable(self):
+        """Gives a copy-on-write map its own grids before the first change."""
+        if self._shared:
+            self._terrain = bytearray(self._terrain)
+            self._building_types = bytearray(self._building_types)
+            self._levels = bytearray(self._levels)
+            self._shared = False
+
+    def get_tile(self, x: int, y: int) -> Optional[CityTileView]:
+        index = self._index(x, y)
+        if index is None:
+            return None
+        return CityTileView(self, index, Position(x, y))
+
+    def get_tile_for_update(self, x: int, y: int) -> Optional[CityTileView]:
+        """
+        Returns the tile at (x, y) for modification. On a copy-on-write map the
+        grids are copied before the first change.
+        """
+        index = self._index(x, y)
+        if index is None:
+            return None
+        self._make_writable()
+        return CityTileView(self, index, Position(x, y))
+
+    def terrain_at(self, x: int, y: int) -> Optional[CityTerrainType]:
+        """The terrain at (x, y), or None outside the map."""
+        index = self._index(x, y)
+        return None if index is None else _TERRAIN_BY_CODE[self._terrain[index]]
+
+    def building_at(self, x: int, y: int) -> Optional[Tuple[BuildingType, int]]:
+        """The (type, level) of the building at (x, y), or None if there is none."""
+        index = self._index(x, y)
+        if index is None or not self._building_types[index]:
+            return None
+        return _BUILDING_BY_CODE[self._building_types[index]], self._levels[index]
+
+    def building_positions(self) -> Iterator[Tuple[int, int]]:
+        """Yields the (x, y) of every tile holding a building."""
+        for index, code in enumerate(self._building_types):
+            if code:
+                yield divmod(index, self.height)
+
+    def building_count(self) -> int:
+        return len(self._building_types) - self._building_types.count(0)
+
+    def find_building(self, building_type: BuildingType) -> Optional[Tuple[int, int]]:
+        """The (x, y) of the first building of the given type, or None."""
+        index = self._building_types.find(building_type.value)
+        return None if index < 0 else divmod(index, self.height)
+
+    def grids(self) -> Tuple[memoryview, memoryview, memoryview]:
+        """Read-only (terrain, building type, level) byte grids, indexed by ``x * height + y``."""
+        return tuple(memoryview(grid).toreadonly() for grid in (self._terrain, self._building_types, self._levels))
+
+    def copy_on_write(self) -> CityMap:
+        """
+        Returns a copy that shares the grids with this map until it is first
+        changed. This map must not be modified while the copy is in use.
+        """
+        return CityMap._from_grids(self.width, self.height, self._terrain, self._building_types, self._levels, shared=True)
+
     def deep_copy(self) -> CityMap:
-        new_map = CityMap(self.width, self.height)
-        new_map.tiles = [[tile.deep_copy() for tile in row] for row in self.tiles]
-        return new_map
+        return CityMap._from_grids(
+            self.width, self.height,
+            bytearray(self._terrain), bytearray(self._building_types), bytearray(self._levels)
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CityMap):
+            return NotImplemented
+        return (self.width, self.height) == (other.width, other.height) and self.to_bytes() == other.to_bytes()
+
+    # Maps are mutable and compared by value, so they are unhashable; key by content_hash() instead
+    __hash__ = None
+
+    def content_hash(self) -> str:
+        """A digest of the map's size and contents; equal maps have equal hashes."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.width.to_bytes(4, 'little') + self.height.to_bytes(4, 'little'))
+        digest.update(self.to_bytes())
+        return digest.hexdigest()
+
+    def to_bytes(self) -> bytes:
+        """The terrain, building type and level grids, concatenated."""
+        return bytes(self._terrain + self._building_types + self._levels)
+
+    @classmethod
+    def from_bytes(cls, width: int, height: int, data: bytes) -> CityMap:
+        size = width * height
+        if len(data) != 3 * size:
+            raise ValueError(f"Expected {3 * size} bytes for a {width}x{height} city map, got {len(data)}.")
+        return cls._from_grids(
+            width, height,
+            bytearray(data[:size]), bytearray(data[size:2 * size]), bytearray(data[2 * size:])
+        )
 
     @classmethod
     def load_from_file(cls, filepath: str) -> CityMap:
@@ -96,24 +285,83 @@ class CityMap:
         for y, line in enumerate(lines):
             for x, char in enumerate(line):
                 terrain = cls.TERRAIN_MAPPING.get(char, CityTerrainType.GRASS)
-                city_map.get_tile(x, y).terrain = terrain # Update terrain of the existing tile
+                city_map._terrain[x * height + y] = terrain.value
         
         print(f"Loaded city map of size {width}x{height} from {filepath}")
         return city_map
     
-    def to_dict(self):
+    def to_dict(self, map_format: str = 'tiles'):
+        """
+        Serializes the map. 'tiles' gives one dict per tile, 'compact' is
+        described in to_compact_dict and 'grids' holds the output of to_bytes
+        (for binary encodings only). from_dict reads all of them.
+        """
+        if map_format == 'compact':
+            return self.to_compact_dict()
+        if map_format == 'grids':
+            return {'width': self.width, 'height': self.height, 'grids': self.to_bytes()}
         return {
             'width': self.width,
             'height': self.height,
-            'tiles': [[tile.to_dict() for tile in row] for row in self.tiles]
+            'tiles': [[self.get_tile(x, y).to_dict() for y in range(self.height)] for x in range(self.width)]
         }
     
+    def to_compact_dict(self):
+        """Run-length encoded terrain rows and a sparse list of [x, y, type, level] buildings."""
+        # The grids are x-major, so every height-th character belongs to the same row.
+        chars = bytes(self._terrain).translate(_CHAR_BY_CODE).decode('ascii')
+        buildings = []
+        for x, y in self.building_positions():
+            building_type, level = self.building_at(x, y)
+            buildings.append([x, y, building_type.name, level])
+        return {
+            'width': self.width,
+            'height': self.height,
+            'terrain': [rle_encode(chars[y::self.height]) for y in range(self.height)],
+            'buildings': buildings
+        }
+
+    @classmethod
+    def _from_compact_dict(cls, data):
+        width, height = data['width'], data['height']
+        terrain = bytearray(width * height)
+        for y, row in enumerate(data['terrain']):
+            terrain[y::height] = rle_decode(row).encode('ascii').translate(_CODE_BY_CHAR)
+        building_types = bytearray(width * height)
+        levels = bytearray(width * height)
+        for x, y, type_name, level in data['buildings']:
+            building_types[x * height + y] = BuildingType[type_name].value
+            levels[x * height + y] = level
+        return cls._from_grids(width, height, terrain, building_types, levels)
+
     @classmethod
     def from_dict(cls, data):
-        city_map = cls(data['width'], data['height'])
-        city_map.tiles = [[CityTile.from_dict(t_data) for t_data in col] for col in data['tiles']]
-        return city_map
+        if 'grids' in data:
+            return cls.from_bytes(data['width'], data['height'], data['grids'])
+        if 'buildings' in data:
+            return cls._from_compact_dict(data)
+        width, height = data['width'], data['height']
+        terrain = bytearray([CityTerrainType.GRASS.value]) * (width * height)
+        building_types = bytearray(width * height)
+        levels = bytearray(width * height)
+        # Place tiles by their recorded position, so both x-major and row-major
+        # tile lists (older saves) load correctly.
+        for col in data['tiles']:
+            for t_data in col:
+                position = t_data['position']
+                index = position['x'] * height + position['y']
+                terrain[index] = CityTerrainType[t_data['terrain']].value
+                building = t_data.get('building')
+                if building:
+                    building_types[index] = BuildingType[building['type']].value
+                    levels[index] = building['level']
+        return cls._from_grids(width, height, terrain, building_types, levels)
 
+# Grid codes are the enum values; building code 0 means "no building".
+_TERRAIN_BY_CODE = {terrain.value: terrain for terrain in CityTerrainType}
+_BUILDING_BY_CODE = {building_type.value: building_type for building_type in BuildingType}
+# bytes.translate tables between terrain codes and TERRAIN_MAPPING characters
+_CODE_BY_CHAR, _CHAR_BY_CODE = char_tables(CityMap.TERRAIN_MAPPING, CityTerrainType.GRASS)
 
 @dataclass
 class City:
@@ -138,21 +386,58 @@ class City:
         self.update_stats_from_citadel()
         if self.action_points == 0: # Only fill AP if it's at the default, not from loading a save
             self.action_points = self.max_action_points
+        self.recalculate_production()
+
+    @property
+    def production(self) -> Resources:
+        """The city's total production per turn, kept up to date by actions."""
+        return Resources(self._production.food, self._production.wood, self._production.iron)
+
+    def recalculate_production(self):
+        """Rebuilds the per-tile production contributions and the running total from scratch."""
+        self._tile_production: Dict[Tuple[int, int], Resources] = {}
+        self._production = Resources()
+        for x, y in self.city_map.building_positions():
+            self._set_tile_production(x, y, tile_production(self.city_map, x, y))
+
+    def refresh_production_around(self, position: Position):
+        """
+        Updates the running production total after the tile at `position` changed.
+        A new building or level only affects that tile, but a terrain change alters
+        the adjacency bonus of every neighbour, so the whole 3x3 block is recomputed.
+        """
+        for dx, dy in ((0, 0),) + NEIGHBOR_OFFSETS:
+            x, y = position.x + dx, position.y + dy
+            if 0 <= x < self.city_map.width and 0 <= y < self.city_map.height:
+                self._set_tile_production(x, y, tile_production(self.city_map, x, y))
+
+        if DEBUG_PRODUCTION:
+            self.verify_production()
+
+    def verify_production(self):
+        """Checks the incremental production total against a full recompute."""
+        expected = city_production(self.city_map)
+        if expected != self._production:
+            raise RuntimeError(
+                f"Incremental production for city '{self.id}' is {self._production}, "
+                f"but a full recompute gives {expected}."
+            )
+
+    def _set_tile_production(self, x: int, y: int, production: Resources):
+        previous = self._tile_production.pop((x, y), None)
+        if previous:
+            self._production -= previous
+        if production.food or production.wood or production.iron:
+            self._tile_production[(x, y)] = production
+            self._production += production
 
     def update_stats_from_citadel(self):
         """Recalculates city-wide stats based on the Citadel's level."""
-        citadel = None
-        num_buildings = 0
-        for row in self.city_map.tiles:
-            for tile in row:
-                if tile.building:
-                    num_buildings += 1
-                    if tile.building.type == BuildingType.CITADEL:
-                        citadel = tile.building
-        
-        self.num_buildings = num_buildings
-        if citadel:
-            citadel_stats = BUILDING_DATA[BuildingType.CITADEL]['provides'].get(citadel.level, {})
+        self.num_buildings = self.city_map.building_count()
+        citadel_position = self.city_map.find_building(BuildingType.CITADEL)
+        if citadel_position:
+            _, citadel_level = self.city_map.building_at(*citadel_position)
+            citadel_stats = BUILDING_DATA[BuildingType.CITADEL]['provides'].get(citadel_level, {})
             self.max_buildings = citadel_stats.get('max_buildings', 0)
             self.max_action_points = citadel_stats.get('action_points', 0)
 
@@ -167,13 +452,28 @@ class City:
         new_city.update_stats_from_citadel() # Recalculate to be safe
         return new_city
 
-    def to_dict(self) -> dict:
+    def copy_on_write(self) -> City:
+        """
+        Returns a copy whose counters, queues and production totals are private,
+        while the city map is shared copy-on-write with this city.
+        """
+        new_city = copy.copy(self)
+        new_city.city_map = self.city_map.copy_on_write()
+        new_city.resources = Resources(self.resources.food, self.resources.wood, self.resources.iron)
+        new_city.build_queue = list(self.build_queue)
+        new_city.recruitment_queue = [progress.deep_copy() for progress in self.recruitment_queue]
+        new_city.garrison = self.garrison.copy()
+        new_city._tile_production = dict(self._tile_production)
+        new_city._production = self.production
+        return new_city
+
+    def to_dict(self, map_format: str = 'tiles') -> dict:
         return {
             'id': self.id,
             'name': self.name,
             'owner_id': self.owner_id,
             'position': self.position.__dict__,
-            'city_map': self.city_map.to_dict(),
+            'city_map': self.city_map.to_dict(map_format),
             'resources': self.resources.__dict__,
             'build_queue': [action.to_dict() for action in self.build_queue],
             'recruitment_queue': [progress.to_dict() for progress in self.recruitment_queue],
@@ -210,4 +510,30 @@ class City:
         # After loading, stats need to be recalculated from the loaded map state
         city.update_stats_from_citadel()
         
-        return city
\ No newline at end of file
+        return city
+
+    def update_from_dict(self, data: dict, action_class_map: dict):
+        """
+        Overwrites the fields present in `data` (in the to_dict format) and
+        leaves the others untouched. A new city map replaces the old one.
+        """
+        for key in ('name', 'owner_id', 'action_points'):
+            if key in data:
+                setattr(self, key, data[key])
+        if 'position' in data:
+            self.position = Position(**data['position'])
+        if 'resources' in data:
+            self.resources = Resources(**data['resources'])
+        if 'build_queue' in data:
+            self.build_queue = [
+                action_class_map[action_data['action_type']].from_dict(action_data)
+                for action_data in data['build_queue'] if action_data['action_type'] in action_class_map
+            ]
+        if 'recruitment_queue' in data:
+            self.recruitment_queue = [RecruitmentProgress.from_dict(p) for p in data['recruitment_queue']]
+        if 'garrison' in data:
+            self.garrison = {UnitType[unit_name]: count for unit_name, count in data['garrison'].items()}
+        if 'city_map' in data:
+            self.city_map = CityMap.from_dict(data['city_map'])
+            self.update_stats_from_citadel()
+            self.recalculate_production()
\ No newline at end of file
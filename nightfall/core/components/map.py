@@ -1,9 +1,13 @@
+import hashlib
 from typing import Optional
 from nightfall.core.common.enums import TerrainType
 from nightfall.core.common.datatypes import Position
+from nightfall.core.common.encoding import char_tables, rle_decode, rle_encode
 
 class Tile:
     """Represents a single tile on the game map."""
+    __slots__ = ('terrain', 'position')
+
     def __init__(self, terrain: TerrainType, position: Position):
         self.terrain = terrain
         self.position = position
@@ -20,7 +24,14 @@ class Tile:
         )
 
 class GameMap:
-    """Represents the game world grid."""
+    """
+    Represents the game world grid.
+
+    The map never changes during a game, so its terrain is a single immutable
+    byte grid of TerrainType values in row-major order (index ``y * width + x``).
+    `get_tile` builds a Tile for the requested cell on demand, and a GameMap can
+    be shared by reference between game states and sessions.
+    """
     TERRAIN_MAPPING = {
         'P': TerrainType.PLAINS,
         'F': TerrainType.FOREST,
@@ -28,43 +39,111 @@ class GameMap:
         'L': TerrainType.LAKE,
     }
 
-    def __init__(self, width: int, height: int):
+    def __init__(self, width: int, height: int, terrain: Optional[bytes] = None):
         self.width = width
         self.height = height
-        self.tiles = [[None for _ in range(width)] for _ in range(height)]
+        if terrain is None:
+            terrain = bytes([TerrainType.PLAINS.value]) * (width * height)
+        elif len(terrain) != width * height:
+            raise ValueError(f"Expected {width * height} terrain codes for a {width}x{height} map, got {len(terrain)}.")
+        self._terrain = bytes(terrain)
+        self._content_hash: Optional[str] = None
 
     def get_tile(self, x: int, y: int) -> Optional[Tile]:
+        terrain = self.terrain_at(x, y)
+        if terrain is None:
+            return None
+        return Tile(terrain, Position(x, y))
+
+    def terrain_at(self, x: int, y: int) -> Optional[TerrainType]:
         if 0 <= x < self.width and 0 <= y < self.height:
-            return self.tiles[y][x]
+            return _TERRAIN_BY_CODE[self._terrain[y * self.width + x]]
         return None
 
+    def to_bytes(self) -> bytes:
+        """The row-major terrain grid."""
+        return self._terrain
+
+    def content_hash(self) -> str:
+        """A digest of the map's size and terrain; maps with the same hash are interchangeable."""
+        if self._content_hash is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.width.to_bytes(4, 'little') + self.height.to_bytes(4, 'little'))
+            digest.update(self._terrain)
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    def deep_copy(self) -> 'GameMap':
+        """The map is immutable, so a copy is the map itself."""
+        return self
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GameMap):
+            return NotImplemented
+        return (self.width, self.height, self._terrain) == (other.width, other.height, other._terrain)
+
+    def __hash__(self) -> int:
+        return hash((self.width, self.height, self._terrain))
+
+    @classmethod
+    def from_rows(cls, rows) -> 'GameMap':
+        """Builds a map from rows of TERRAIN_MAPPING characters. Unknown characters are plains."""
+        height = len(rows)
+        width = len(rows[0]) if height > 0 else 0
+        terrain = b''.join(row[:width].ljust(width, 'P').encode('ascii', 'replace').translate(_CODE_BY_CHAR) for row in rows)
+        return cls(width, height, terrain)
+
+    def to_rows(self):
+        """The map as rows of TERRAIN_MAPPING characters, the inverse of from_rows."""
+        chars = self._terrain.translate(_CHAR_BY_CODE).decode('ascii')
+        return [chars[y * self.width:(y + 1) * self.width] for y in range(self.height)]
+
     @classmethod
     def load_from_file(cls, filepath: str):
         """Loads a map layout from a text file."""
         with open(filepath, 'r') as f:
             lines = [line.strip() for line in f.readlines()]
-        
-        height = len(lines)
-        width = len(lines[0]) if height > 0 else 0
-        
-        game_map = cls(width, height)
-        for y, line in enumerate(lines):
-            for x, char in enumerate(line):
-                terrain = cls.TERRAIN_MAPPING.get(char, TerrainType.PLAINS)
-                game_map.tiles[y][x] = Tile(terrain, Position(x, y))
-        
-        print(f"Loaded map of size {width}x{height} from {filepath}")
+
+        game_map = cls.from_rows(lines)
+        print(f"Loaded map of size {game_map.width}x{game_map.height} from {filepath}")
         return game_map
 
-    def to_dict(self):
-        return {
-            'width': self.width,
-            'height': self.height,
-            'tiles': [[tile.to_dict() for tile in row] for row in self.tiles]
-        }
+    def to_dict(self, map_format: str = 'tiles'):
+        """
+        Serializes the map. 'tiles' gives one string of terrain letters per row,
+        'compact' run-length encodes those rows and 'grids' holds the raw terrain
+        codes as bytes (for binary encodings only). from_dict reads all of them.
+        'ref' only identifies the map by its content hash, for peers that can
+        look the map up themselves; from_dict cannot resolve it.
+        """
+        if map_format == 'ref':
+            return {'width': self.width, 'height': self.height, 'hash': self.content_hash()}
+        if map_format == 'grids':
+            return {'width': self.width, 'height': self.height, 'grid': self._terrain}
+        rows = self.to_rows()
+        if map_format == 'compact':
+            return {'width': self.width, 'height': self.height, 'rle_rows': [rle_encode(row) for row in rows]}
+        return {'width': self.width, 'height': self.height, 'rows': rows}
 
     @classmethod
     def from_dict(cls, data):
-        game_map = cls(data['width'], data['height'])
-        game_map.tiles = [[Tile.from_dict(tile_data) for tile_data in row] for row in data['tiles']]
-        return game_map
+        if 'hash' in data:
+            raise ValueError(f"Map {data['hash']} is only referenced by its hash and must be looked up.")
+        if 'grid' in data:
+            return cls(data['width'], data['height'], data['grid'])
+        if 'rle_rows' in data:
+            return cls.from_rows([rle_decode(row) for row in data['rle_rows']])
+        if 'rows' in data:
+            return cls.from_rows(data['rows'])
+        # Older saves store one dict per tile, row by row
+        terrain = bytearray([TerrainType.PLAINS.value]) * (data['width'] * data['height'])
+        for row in data['tiles']:
+            for tile_data in row:
+                position = tile_data['position']
+                terrain[position['y'] * data['width'] + position['x']] = TerrainType[tile_data['terrain']].value
+        return cls(data['width'], data['height'], terrain)
+
+
+_TERRAIN_BY_CODE = {terrain.value: terrain for terrain in TerrainType}
+# bytes.translate tables between terrain codes and TERRAIN_MAPPING characters
+_CODE_BY_CHAR, _CHAR_BY_CODE = char_tables(GameMap.TERRAIN_MAPPING, TerrainType.PLAINS)
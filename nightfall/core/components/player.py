@@ -19,6 +19,10 @@ class Player:
             return all_cities[city_id]
         return None
 
+    def copy_on_write(self) -> 'Player':
+        """Returns a copy with its own action queue list; city ids are shared."""
+        return Player(self.name, self.city_ids, list(self.action_queue))
+
     def to_dict(self) -> dict:
         return {
             'name': self.name,
@@ -0,0 +1,104 @@
+"""
+Instrumentation hooks for the Simulator.
+
+A Simulator built with `hooks=` reports how long each phase of a turn took and
+how every action fared. `SimulationHooks` is the no-op interface; `TurnMetrics`
+is the aggregating implementation used by the server.
+"""
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable
+
+# Phases of Simulator.simulate_full_turn, in execution order
+PHASE_AP_REFILL = 'ap_refill'
+PHASE_ACTIONS = 'actions'
+PHASE_PRODUCTION = 'production'
+PHASE_RECRUITMENT = 'recruitment'
+PHASE_TURN_INCREMENT = 'turn_increment'
+TURN_PHASES = (PHASE_AP_REFILL, PHASE_ACTIONS, PHASE_PRODUCTION, PHASE_RECRUITMENT, PHASE_TURN_INCREMENT)
+
+
+class SimulationHooks:
+    """Receives timing and outcome events from the Simulator. All methods are no-ops by default."""
+    def on_phase(self, phase: str, seconds: float):
+        """Called after each turn phase with its wall-clock duration."""
+        pass
+
+    def on_action(self, action_name: str, success: bool, seconds: float):
+        """Called after each executed action with its class name, outcome and duration."""
+        pass
+
+    def on_turn(self, seconds: float):
+        """Called after a full turn with its total duration."""
+        pass
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100). Returns 0.0 for no samples."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(samples: Iterable[float]) -> dict:
+    """The p50/p95/p99 (in seconds) and count of latency samples, as reported in stats."""
+    samples = list(samples)
+    return {
+        'p50_s': percentile(samples, 50),
+        'p95_s': percentile(samples, 95),
+        'p99_s': percentile(samples, 99),
+        'samples': len(samples),
+    }
+
+
+@dataclass
+class ActionStats:
+    executions: int = 0
+    failures: int = 0
+    total_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {'executions': self.executions, 'failures': self.failures, 'total_seconds': self.total_seconds}
+
+
+class TurnMetrics(SimulationHooks):
+    """
+    Aggregates simulation events: total time and count per phase, executions,
+    failures and time per action class, and the durations of recent turns for
+    latency percentiles.
+    """
+    def __init__(self, max_turn_samples: int = 1000):
+        self.turns = 0
+        self.phase_seconds: Dict[str, float] = {phase: 0.0 for phase in TURN_PHASES}
+        self.actions: Dict[str, ActionStats] = {}
+        self.turn_seconds: Deque[float] = deque(maxlen=max_turn_samples)
+
+    def on_phase(self, phase: str, seconds: float):
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + seconds
+
+    def on_action(self, action_name: str, success: bool, seconds: float):
+        stats = self.actions.get(action_name)
+        if stats is None:
+            stats = self.actions[action_name] = ActionStats()
+        stats.executions += 1
+        stats.total_seconds += seconds
+        if not success:
+            stats.failures += 1
+
+    def on_turn(self, seconds: float):
+        self.turns += 1
+        self.turn_seconds.append(seconds)
+
+    def turn_latency(self) -> dict:
+        return latency_summary(self.turn_seconds)
+
+    def to_dict(self) -> dict:
+        return {
+            'turns': self.turns,
+            'turn_latency': self.turn_latency(),
+            'phase_seconds': dict(self.phase_seconds),
+            'actions': {name: stats.to_dict() for name, stats in self.actions.items()},
+        }
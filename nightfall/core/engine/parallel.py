@@ -0,0 +1,74 @@
+"""
+City-partitioned turn execution.
+
+Actions only ever modify the city they target, so a turn can be split into one
+independent work item per city: refill AP, apply that city's actions in queue
+order, then add its production. Work items run in a `concurrent.futures`
+executor (normally a process pool) and the updated cities are merged back into
+the game state in the state's own city order, so the outcome is identical to a
+serial turn regardless of which worker finishes first.
+"""
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from nightfall.core.actions.action import Action, ActionResult
+from nightfall.core.components.city import City
+from nightfall.core.components.player import Player
+from nightfall.core.state.game_state import GameState
+
+
+@dataclass
+class CityPartition:
+    """Everything a worker needs to resolve one city's turn."""
+    city: City
+    actions: List[Action] = field(default_factory=list)
+
+
+def _resolve_city_partition(partition: CityPartition) -> Tuple[City, List[Tuple[ActionResult, float]]]:
+    """
+    Worker entry point. Runs in a separate process, so it must stay module-level.
+    Returns the updated city and, per action, its result and duration.
+    """
+    city = partition.city
+    players = {action.player_id: Player(action.player_id, [city.id]) for action in partition.actions}
+    city_state = GameState(None, players, {city.id: city})
+
+    city.action_points = city.max_action_points
+    results = []
+    for action in partition.actions:
+        action_start = time.perf_counter()
+        result = action.execute(city_state)
+        results.append((result, time.perf_counter() - action_start))
+    city.resources += city.production
+    return city, results
+
+
+def partition_actions(game_state) -> Tuple[Dict[str, CityPartition], List[Action]]:
+    """
+    Groups every queued action by the city it targets, preserving queue order,
+    and clears the player queues. Actions whose acting player does not own the
+    target city are returned separately so the caller can execute (and fail)
+    them against the full state.
+    """
+    partitions: Dict[str, CityPartition] = {}
+    unpartitioned: List[Action] = []
+    for player in game_state.players.values():
+        actions_to_process = list(player.action_queue)
+        player.action_queue.clear()
+        for action in actions_to_process:
+            acting_player = game_state.players.get(action.player_id)
+            if acting_player and acting_player.get_city(action.city_id, game_state.cities):
+                partition = partitions.get(action.city_id)
+                if partition is None:
+                    partition = partitions[action.city_id] = CityPartition(game_state.cities[action.city_id])
+                partition.actions.append(action)
+            else:
+                unpartitioned.append(action)
+    return partitions, unpartitioned
+
+
+def resolve_partitions(executor: Executor, partitions: Dict[str, CityPartition]) -> Dict[str, Tuple[City, List[Tuple[ActionResult, float]]]]:
+    """Resolves all partitions in the executor and returns the results keyed by city id."""
+    futures = {city_id: executor.submit(_resolve_city_partition, partition) for city_id, partition in partitions.items()}
+    return {city_id: future.result() for city_id, future in futures.items()}
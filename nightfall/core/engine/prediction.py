@@ -0,0 +1,80 @@
+from typing import List, Optional
+from nightfall.core.actions.action import Action, ActionResult
+from nightfall.core.state.game_state import GameState
+
+
+class PredictionCache:
+    """
+    Incrementally predicts the outcome of a player's action queue.
+
+    The state after every queue prefix is kept as a stack of copy-on-write
+    overlays: entry i is the state after the first i actions, and entry 0 is
+    the base (server) state itself. When the queue changes, only the actions
+    after the longest unchanged prefix are simulated again, so appending an
+    action costs one action and removing the action at index i resumes from
+    the state after the first i actions.
+
+    The result of every cached action is kept too, so the verdicts for the
+    queue (see `results`) come with the prediction at no extra cost.
+
+    With `refill_action_points`, the queue is predicted as orders for the next
+    turn, like the server validates them: the player's cities start with full
+    action points.
+
+    The base state must not be modified while it is cached; call `reset`
+    whenever a new server state arrives.
+    """
+    def __init__(self, player_id: str, refill_action_points: bool = False):
+        self.player_id = player_id
+        self.refill_action_points = refill_action_points
+        self._actions: List[Action] = []
+        self._results: List[ActionResult] = []
+        self._states: List[GameState] = []
+
+    def reset(self, base_state: Optional[GameState]):
+        """Drops every cached prefix and starts over from a new base state."""
+        self._actions = []
+        self._results = []
+        if base_state is not None and self.refill_action_points:
+            base_state = base_state.overlay()
+            player = base_state.players.get(self.player_id)
+            # Actions only succeed on the player's own cities, so only those need refilling
+            for city_id in (player.city_ids if player else []):
+                city = base_state.cities.get(city_id)
+                if city:
+                    city.action_points = city.max_action_points
+        self._states = [base_state] if base_state is not None else []
+
+    @property
+    def results(self) -> List[ActionResult]:
+        """The result of each action of the queue last passed to `predict`."""
+        return list(self._results)
+
+    def predict(self, action_queue: List[Action]) -> Optional[GameState]:
+        """Returns the predicted state after executing the whole action queue."""
+        if not self._states:
+            return None
+
+        # Find how much of the cached queue is still valid
+        prefix = 0
+        max_prefix = min(len(self._actions), len(action_queue))
+        while prefix < max_prefix and self._actions[prefix] is action_queue[prefix]:
+            prefix += 1
+
+        del self._actions[prefix:]
+        del self._results[prefix:]
+        del self._states[prefix + 1:]
+
+        for action in action_queue[prefix:]:
+            state = self._states[-1].overlay()
+            self._results.append(action.execute(state))
+            self._actions.append(action)
+            self._states.append(state)
+
+        predicted_state = self._states[-1]
+        if len(self._states) > 1:
+            # Only prediction overlays get the queue; the base state is left as is
+            player = predicted_state.players.get(self.player_id)
+            if player:
+                player.action_queue = list(action_queue)
+        return predicted_state
@@ -0,0 +1,172 @@
+"""
+Resource production rules for city maps.
+
+Two implementations live here and must always agree exactly:
+
+* ``tile_production`` / ``city_production`` walk the tiles in plain Python and
+  are used whenever a single tile or a small city needs evaluating.
+* ``ArrayProductionEngine`` keeps terrain, building type and building level as
+  integer grids and computes adjacency multipliers for a whole city (or a
+  whole batch of equally sized cities) with a 3x3 neighbourhood convolution.
+  It requires NumPy, which is an optional dependency.
+
+Both paths accumulate the adjacency multiplier in the same order (1.0, then
+the bonus of each neighbour in ``NEIGHBOR_OFFSETS`` order) so that the floating
+point results, and therefore the rounded totals, are identical.
+"""
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the pure-Python path is always available.
+    np = None
+
+from nightfall.core.common.datatypes import Resources
+from nightfall.core.common.enums import BuildingType, CityTerrainType
+from nightfall.core.common.game_data import BUILDING_DATA
+
+# 8-directional neighbourhood used for adjacency bonuses
+NEIGHBOR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def _adjacency_multiplier(city_map, x: int, y: int, adjacency_bonus: dict) -> float:
+    multiplier = 1.0
+    for dx, dy in NEIGHBOR_OFFSETS:
+        neighbor_terrain = city_map.terrain_at(x + dx, y + dy)
+        if neighbor_terrain and neighbor_terrain.name in adjacency_bonus:
+            multiplier += adjacency_bonus[neighbor_terrain.name]
+    return multiplier
+
+
+def tile_production(city_map, x: int, y: int) -> Resources:
+    """Returns the production of the building at (x, y), including adjacency bonuses."""
+    building = city_map.building_at(x, y)
+    if not building:
+        return Resources()
+
+    building_type, level = building
+    building_data = BUILDING_DATA.get(building_type)
+    if not building_data or 'production' not in building_data:
+        return Resources()
+
+    base_prod = building_data['production'].get(level, Resources())
+    multiplier = 1.0
+    if 'adjacency_bonus' in building_data:
+        multiplier = _adjacency_multiplier(city_map, x, y, building_data['adjacency_bonus'])
+
+    return Resources(
+        food=round(base_prod.food * multiplier),
+        wood=round(base_prod.wood * multiplier),
+        iron=round(base_prod.iron * multiplier)
+    )
+
+
+def city_production(city_map) -> Resources:
+    """Returns the total production of every building on a city map."""
+    total_production = Resources()
+    for x, y in city_map.building_positions():
+        production = tile_production(city_map, x, y)
+        total_production.food += production.food
+        total_production.wood += production.wood
+        total_production.iron += production.iron
+    return total_production
+
+
+class ArrayProductionEngine:
+    """
+    Computes city production on integer grids with NumPy.
+
+    Terrain, building type and building level are encoded as their enum values
+    (0 meaning "no building"), laid out as ``[x, y]`` like the ``CityMap`` grids.
+    Lookup tables derived from ``BUILDING_DATA`` turn those grids into base
+    production and per-terrain bonus arrays, so a whole city is evaluated with
+    a handful of vectorised operations instead of a Python loop per tile.
+    """
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("ArrayProductionEngine requires NumPy to be installed.")
+
+        num_building_codes = max(b.value for b in BuildingType) + 1
+        num_terrain_codes = max(t.value for t in CityTerrainType) + 1
+        max_level = max(
+            (max(data.get('production', {0: None})) for data in BUILDING_DATA.values()),
+            default=0
+        )
+
+        # base_production[building_code, level, resource]
+        self.base_production = np.zeros((num_building_codes, max_level + 1, 3), dtype=np.int64)
+        # adjacency_bonus[terrain_code, building_code]
+        self.adjacency_bonus = np.zeros((num_terrain_codes, num_building_codes), dtype=np.float64)
+
+        for building_type, data in BUILDING_DATA.items():
+            for level, production in data.get('production', {}).items():
+                self.base_production[building_type.value, level] = (production.food, production.wood, production.iron)
+            for terrain_name, bonus in data.get('adjacency_bonus', {}).items():
+                self.adjacency_bonus[CityTerrainType[terrain_name].value, building_type.value] = bonus
+
+
+    @staticmethod
+    def encode_city_map(city_map):
+        """Returns the (terrain, building_type, level) integer grids for a city map."""
+        shape = (city_map.width, city_map.height)
+        terrain, building_type, level = (
+            np.frombuffer(grid, dtype=np.uint8).reshape(shape).astype(np.int64) for grid in city_map.grids()
+        )
+        return terrain, building_type, level
+
+    def _production_grids(self, terrain, building_type, level):
+        """Per-tile production of shape (..., width, height, 3)."""
+        # Levels without production data (row 0 is all zeros) produce nothing
+        level = np.where(level < self.base_production.shape[1], level, 0)
+        base = self.base_production[building_type, level]
+
+        # 3x3 neighbourhood convolution over the last two axes. Out-of-bounds
+        # neighbours are padded with terrain code 0, which grants no bonus.
+        padded = np.pad(terrain, [(0, 0)] * (terrain.ndim - 2) + [(1, 1), (1, 1)])
+        width, height = terrain.shape[-2], terrain.shape[-1]
+        multiplier = np.ones(terrain.shape, dtype=np.float64)
+        for dx, dy in NEIGHBOR_OFFSETS:
+            neighbor_terrain = padded[..., 1 + dx:1 + dx + width, 1 + dy:1 + dy + height]
+            multiplier += self.adjacency_bonus[neighbor_terrain, building_type]
+
+        return np.rint(base * multiplier[..., np.newaxis]).astype(np.int64)
+
+    def calculate(self, city_map) -> Resources:
+        """Total production of a single city map."""
+        grids = self.encode_city_map(city_map)
+        food, wood, iron = self._production_grids(*grids).sum(axis=(0, 1))
+        return Resources(int(food), int(wood), int(iron))
+
+    def calculate_batch(self, city_maps: Iterable) -> List[Resources]:
+        """
+        Total production for many city maps at once. Maps of the same size are
+        stacked and evaluated together; results keep the input order.
+        """
+        city_maps = list(city_maps)
+        results: List[Optional[Resources]] = [None] * len(city_maps)
+
+        groups: Dict[tuple, List[int]] = {}
+        for index, city_map in enumerate(city_maps):
+            groups.setdefault((city_map.width, city_map.height), []).append(index)
+
+        for indices in groups.values():
+            encoded = [self.encode_city_map(city_maps[i]) for i in indices]
+            stacked = [np.stack(grids) for grids in zip(*encoded)]
+            totals = self._production_grids(*stacked).sum(axis=(1, 2))
+            for index, (food, wood, iron) in zip(indices, totals):
+                results[index] = Resources(int(food), int(wood), int(iron))
+
+        return results
+
+
+_array_engine: Optional[ArrayProductionEngine] = None
+
+
+def get_array_engine() -> Optional[ArrayProductionEngine]:
+    """Returns the shared array engine, or None if NumPy is not installed."""
+    global _array_engine
+    if _array_engine is None and np is not None:
+        _array_engine = ArrayProductionEngine()
+    return _array_engine
@@ -1,24 +1,82 @@
+import logging
+import time
+from concurrent.futures import Executor
+from typing import Dict, Optional
+from nightfall.core.actions.action import ActionResult
 from nightfall.core.state.game_state import GameState
-from nightfall.core.components.city import City, CityMap
-from nightfall.core.common.game_data import BUILDING_DATA
-from nightfall.core.common.datatypes import Resources, Position
-from nightfall.core.common.enums import BuildingType
+from nightfall.core.components.city import City
+from nightfall.core.common.datatypes import Resources, ResourceTrajectory
+from nightfall.core.engine.production import city_production, get_array_engine
+from nightfall.core.engine.parallel import partition_actions, resolve_partitions
+from nightfall.core.engine.turn_report import TurnReport
+from nightfall.core.engine.validation import QueueValidation, validate_queue
+from nightfall.core.engine.instrumentation import (
+    PHASE_ACTIONS, PHASE_AP_REFILL, PHASE_PRODUCTION, PHASE_RECRUITMENT, PHASE_TURN_INCREMENT, SimulationHooks
+)
+
+logger = logging.getLogger(__name__)
 
 class Simulator:
     """
     Handles the core game logic for simulating turns and predicting outcomes.
     This class is stateless and operates on a given GameState object.
+
+    If an executor is given, full turns are resolved city by city in that
+    executor (see nightfall.core.engine.parallel) instead of serially.
+    If hooks are given, they receive the duration of every turn phase and the
+    outcome and duration of every executed action.
     """
+    def __init__(self, executor: Optional[Executor] = None, hooks: Optional[SimulationHooks] = None):
+        self.executor = executor
+        self.hooks = hooks
 
-    def simulate_full_turn(self, game_state: GameState):
+    def simulate_full_turn(self, game_state: GameState) -> TurnReport:
         """
         Simulates a full turn for all players.
-        This modifies the game_state object in place.
+        This modifies the game_state object in place and returns a report of
+        every action resolved during the turn.
         """
+        turn_start = time.perf_counter()
+        report = TurnReport(game_state.turn)
+        if self.executor:
+            self._simulate_partitioned_turn(game_state, report)
+        else:
+            self._simulate_serial_turn(game_state, report)
+        if self.hooks:
+            self.hooks.on_turn(time.perf_counter() - turn_start)
+        return report
+
+    def _end_phase(self, phase: str, phase_start: float) -> float:
+        """Reports a finished phase to the hooks and returns the start time of the next one."""
+        now = time.perf_counter()
+        if self.hooks:
+            self.hooks.on_phase(phase, now - phase_start)
+        return now
+
+    def _record_action(self, report: TurnReport, action, result: ActionResult, seconds: float):
+        report.add(action, result)
+        if self.hooks:
+            self.hooks.on_action(type(action).__name__, result.success, seconds)
+        if result:
+            logger.debug("Successfully executed action: %s", action)
+        else:
+            # If an action fails, it's simply discarded.
+            # A more complex system might refund resources.
+            logger.debug("Failed to execute action: %s. It has been removed from the queue.", action)
+
+    def _execute_action(self, action, game_state: GameState, report: TurnReport):
+        action_start = time.perf_counter()
+        result = action.execute(game_state)
+        self._record_action(report, action, result, time.perf_counter() - action_start)
+
+    def _simulate_serial_turn(self, game_state: GameState, report: TurnReport):
+        phase_start = time.perf_counter()
+
         # 1. Replenish Action Points for all cities
         for city in game_state.cities.values():
             # This is the corrected logic. We SET the action points to the max, not add to them.
             city.action_points = city.max_action_points
+        phase_start = self._end_phase(PHASE_AP_REFILL, phase_start)
 
         # 2. Process build queues for all players
         for player in game_state.players.values():
@@ -28,30 +86,112 @@ class Simulator:
 
             for action in actions_to_process:
                 # In a real scenario, you might check if the player still owns the city
-                if action.execute(game_state):
-                    print(f"Successfully executed action: {action}")
-                else:
-                    # If an action fails, it's simply discarded.
-                    # A more complex system might refund resources.
-                    print(f"Failed to execute action: {action}. It has been removed from the queue.")
-
-        # 3. Calculate and add resource production
+                self._execute_action(action, game_state, report)
+        phase_start = self._end_phase(PHASE_ACTIONS, phase_start)
+
+        # 3. Add resource production. Each city keeps its total up to date as
+        # actions change its map, so no tile scan is needed here.
         for city in game_state.cities.values():
-            production = self.calculate_resource_production(game_state, city)
-            city.resources += production
+            city.resources += city.production
+        phase_start = self._end_phase(PHASE_PRODUCTION, phase_start)
 
         # 4. Process unit recruitment
         # (This logic would go here)
+        phase_start = self._end_phase(PHASE_RECRUITMENT, phase_start)
 
         # 5. Increment turn counter
         game_state.turn += 1
+        self._end_phase(PHASE_TURN_INCREMENT, phase_start)
+
+    def _simulate_partitioned_turn(self, game_state: GameState, report: TurnReport):
+        """
+        Same phases as simulate_full_turn, but each city with queued actions is
+        resolved (AP refill, actions, production) as an independent work item
+        in the executor. Results are merged back in the state's city order.
+        The phases are reported as in a serial turn: the AP refill of the cities
+        handled inline, the worker time as the actions phase, merging and the
+        inline cities' production as the production phase, then recruitment.
+        """
+        phase_start = time.perf_counter()
+        partitions, unpartitioned = partition_actions(game_state)
+
+        # Cities without actions are not shipped to a worker; workers refill their own city
+        for city_id, city in game_state.cities.items():
+            if city_id not in partitions:
+                city.action_points = city.max_action_points
+        phase_start = self._end_phase(PHASE_AP_REFILL, phase_start)
+
+        # Actions that target a city the acting player does not own fail without touching any city
+        for action in unpartitioned:
+            self._execute_action(action, game_state, report)
+
+        results = resolve_partitions(self.executor, partitions) if partitions else {}
+        phase_start = self._end_phase(PHASE_ACTIONS, phase_start)
+
+        for city_id in list(game_state.cities):
+            if city_id in results:
+                city, action_results = results[city_id]
+                game_state.cities[city_id] = city
+                for action, (result, seconds) in zip(partitions[city_id].actions, action_results):
+                    self._record_action(report, action, result, seconds)
+            else:
+                game_state.cities[city_id].resources += game_state.cities[city_id].production
+        phase_start = self._end_phase(PHASE_PRODUCTION, phase_start)
+
+        # Unit recruitment would go here, as in the serial turn
+        phase_start = self._end_phase(PHASE_RECRUITMENT, phase_start)
+
+        game_state.turn += 1
+        self._end_phase(PHASE_TURN_INCREMENT, phase_start)
+
+    def simulate_turns(self, game_state: GameState, num_turns: int) -> Dict[str, ResourceTrajectory]:
+        """
+        Advances the game state by `num_turns` turns in place and returns, for
+        each city, its resource stockpiles at the end of every simulated turn.
+
+        Turns are simulated one by one only while there is something to process
+        (queued actions or pending recruitment). Once the state is idle, the
+        remaining turns are collapsed into a single bulk accrual of
+        production x turns, which is exactly what that many full turns would do.
+        Pass an overlay (`game_state.overlay()`) to forecast without changing the state.
+        """
+        trajectories = {city_id: ResourceTrajectory() for city_id in game_state.cities}
+        remaining = num_turns
+
+        while remaining > 0 and not self._is_idle(game_state):
+            self.simulate_full_turn(game_state)
+            for city_id, city in game_state.cities.items():
+                trajectories.setdefault(city_id, ResourceTrajectory()).append(city.resources)
+            remaining -= 1
+
+        if remaining > 0:
+            for city_id, city in game_state.cities.items():
+                production = city.production
+                trajectories.setdefault(city_id, ResourceTrajectory()).extend_linear(city.resources, production, remaining)
+                city.action_points = city.max_action_points
+                city.resources = Resources(
+                    city.resources.food + production.food * remaining,
+                    city.resources.wood + production.wood * remaining,
+                    city.resources.iron + production.iron * remaining
+                )
+            game_state.turn += remaining
+
+        return trajectories
+
+    @staticmethod
+    def _is_idle(game_state: GameState) -> bool:
+        """A state is idle when a turn would only refill AP and add production."""
+        if any(player.action_queue for player in game_state.players.values()):
+            return False
+        return not any(city.recruitment_queue for city in game_state.cities.values())
 
     def predict_outcome(self, base_state: GameState, action_queue: list, player_id: str) -> GameState:
         """
-        Creates a deep copy of the game state and simulates the provided action
-        queue to show a predicted outcome to the client.
+        Creates a copy-on-write overlay of the game state and simulates the
+        provided action queue to show a predicted outcome to the client.
+        The base state is left untouched.
         """
-        predicted_state = base_state.deep_copy()
+        predicted_state = base_state.overlay()
         player = predicted_state.players.get(player_id)
         if not player:
             return predicted_state # Should not happen
@@ -65,51 +205,33 @@ class Simulator:
 
         return predicted_state
 
-    def _get_neighbors(self, city_map: CityMap, x: int, y: int) -> list[Position]:
+    def validate_queue(self, game_state: GameState, actions: list, refill_action_points: bool = False) -> QueueValidation:
         """
-        Helper function to get valid neighbor positions for a tile in a city map.
-        This was missing from the CityMap class, so it's implemented here.
+        Dry-runs an action queue and returns a verdict per action plus the final
+        AP, resource and building budget of every city involved. The game state
+        is neither modified nor copied. See nightfall.core.engine.validation.
         """
-        neighbors = []
-        for dx, dy in [
-            (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)
-        ]: # 8-directional neighbors
-            nx, ny = x + dx, y + dy
-            # Check if the neighbor is within the map boundaries
-            if 0 <= nx < city_map.width and 0 <= ny < city_map.height:
-                neighbors.append(Position(nx, ny))
-        return neighbors
+        return validate_queue(game_state, actions, refill_action_points)
 
     def calculate_resource_production(self, game_state: GameState, city: City) -> Resources:
         """
         Calculates the total resource production for a single city,
         including adjacency bonuses.
         """
-        total_production = Resources()
-        city_map = city.city_map
-
-        for y in range(city_map.height):
-            for x in range(city_map.width):
-                tile = city_map.get_tile(x, y)
-                if not tile or not tile.building:
-                    continue
-
-                building = tile.building
-                building_data = BUILDING_DATA.get(building.type)
-                if not building_data or 'production' not in building_data:
-                    continue
-
-                base_prod = building_data['production'].get(building.level, Resources())
-                adjacency_bonus_multiplier = 1.0
-
-                if 'adjacency_bonus' in building_data:
-                    for neighbor_pos in self._get_neighbors(city_map, x, y):
-                        neighbor_tile = city_map.get_tile(neighbor_pos.x, neighbor_pos.y)
-                        if neighbor_tile and neighbor_tile.terrain.name in building_data['adjacency_bonus']:
-                            adjacency_bonus_multiplier += building_data['adjacency_bonus'][neighbor_tile.terrain.name]
-
-                total_production.food += round(base_prod.food * adjacency_bonus_multiplier)
-                total_production.wood += round(base_prod.wood * adjacency_bonus_multiplier)
-                total_production.iron += round(base_prod.iron * adjacency_bonus_multiplier)
-
-        return total_production
\ No newline at end of file
+        engine = get_array_engine()
+        if engine:
+            return engine.calculate(city.city_map)
+        return city_production(city.city_map)
+
+    def calculate_all_resource_production(self, game_state: GameState) -> Dict[str, Resources]:
+        """
+        Calculates the production of every city in the game state in one call.
+        With NumPy installed, all cities of the same map size are evaluated as
+        a single batch; otherwise each city is walked tile by tile.
+        """
+        engine = get_array_engine()
+        if engine:
+            city_ids = list(game_state.cities)
+            totals = engine.calculate_batch(game_state.cities[c_id].city_map for c_id in city_ids)
+            return dict(zip(city_ids, totals))
+        return {c_id: city_production(city.city_map) for c_id, city in game_state.cities.items()}
@@ -0,0 +1,48 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import List
+from nightfall.core.actions.action import Action, ActionResult
+
+# Column order of a report entry
+ENTRY_FIELDS = ('player_id', 'city_id', 'action_type', 'failure', 'food', 'wood', 'iron', 'ap')
+
+
+@dataclass
+class TurnReport:
+    """
+    Compact log of every action resolved during a turn. Each entry is a flat
+    list following ENTRY_FIELDS; `failure` is None for successful actions and
+    the deltas are the changes applied to the city.
+    """
+    turn: int
+    entries: List[list] = field(default_factory=list)
+
+    def add(self, action: Action, result: ActionResult):
+        delta = result.resource_delta
+        self.entries.append([
+            action.player_id,
+            action.city_id,
+            type(action).__name__,
+            result.failure.name if result.failure else None,
+            delta.food, delta.wood, delta.iron,
+            result.ap_delta
+        ])
+
+    @property
+    def succeeded(self) -> int:
+        return sum(1 for entry in self.entries if entry[3] is None)
+
+    @property
+    def failed(self) -> int:
+        return len(self.entries) - self.succeeded
+
+    def for_player(self, player_id: str) -> TurnReport:
+        """Returns the part of the report about actions issued by one player."""
+        return TurnReport(self.turn, [entry for entry in self.entries if entry[0] == player_id])
+
+    def to_dict(self) -> dict:
+        return {'turn': self.turn, 'fields': list(ENTRY_FIELDS), 'entries': self.entries}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> TurnReport:
+        return cls(data['turn'], [list(entry) for entry in data.get('entries', [])])
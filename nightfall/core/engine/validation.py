@@ -0,0 +1,131 @@
+"""
+Dry-run validation of action queues.
+
+`validate_queue` runs the actions' own `execute` logic against lightweight
+budget objects instead of the real cities, so the verdicts always follow the
+same rules as a real turn. A budget tracks only what actions read and spend:
+action points, resources, the building count and the handful of tiles the
+queue has touched. The GameState is only ever read; nothing in it is modified
+or cloned.
+"""
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+from nightfall.core.actions.action import Action, ActionResult
+from nightfall.core.common.datatypes import RecruitmentProgress, Resources
+from nightfall.core.components.city import City, CityTile
+
+
+class _BudgetCityMap:
+    """Read-through view of a city map that records tile changes in a small overlay."""
+    def __init__(self, city_map):
+        self._city_map = city_map
+        self.width = city_map.width
+        self.height = city_map.height
+        self.changed_tiles: Dict[Tuple[int, int], CityTile] = {}
+
+    def get_tile(self, x: int, y: int) -> Optional[CityTile]:
+        return self.changed_tiles.get((x, y)) or self._city_map.get_tile(x, y)
+
+    def get_tile_for_update(self, x: int, y: int) -> Optional[CityTile]:
+        tile = self.changed_tiles.get((x, y))
+        if tile is None:
+            base_tile = self._city_map.get_tile(x, y)
+            if base_tile is None:
+                return None
+            tile = self.changed_tiles[(x, y)] = base_tile.deep_copy()
+        return tile
+
+
+class CityBudget:
+    """
+    The running budget of one city while a queue is validated. It exposes the
+    parts of the City interface that actions use.
+    """
+    def __init__(self, city: City, refill_action_points: bool = False):
+        self.id = city.id
+        self.owner_id = city.owner_id
+        self.action_points = city.max_action_points if refill_action_points else city.action_points
+        self.max_action_points = city.max_action_points
+        self.resources = Resources(city.resources.food, city.resources.wood, city.resources.iron)
+        self.num_buildings = city.num_buildings
+        self.max_buildings = city.max_buildings
+        self.city_map = _BudgetCityMap(city.city_map)
+        self.recruitment_queue: List[RecruitmentProgress] = []
+
+    def refresh_production_around(self, position):
+        """Production is only added after all actions, so the budget does not track it."""
+        pass
+
+    def to_dict(self) -> dict:
+        return {
+            'action_points': self.action_points,
+            'resources': self.resources.__dict__,
+            'num_buildings': self.num_buildings,
+        }
+
+
+class _BudgetCities(Mapping):
+    """Maps city ids to budgets, creating each budget on first use."""
+    def __init__(self, cities: Mapping[str, City], refill_action_points: bool):
+        self._cities = cities
+        self._refill_action_points = refill_action_points
+        self.budgets: Dict[str, CityBudget] = {}
+
+    def __getitem__(self, city_id: str) -> CityBudget:
+        budget = self.budgets.get(city_id)
+        if budget is None:
+            budget = self.budgets[city_id] = CityBudget(self._cities[city_id], self._refill_action_points)
+        return budget
+
+    def __contains__(self, city_id) -> bool:
+        return city_id in self._cities
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._cities)
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+
+class _BudgetState:
+    """Stands in for the GameState while actions are validated."""
+    def __init__(self, game_state, refill_action_points: bool):
+        self.game_map = game_state.game_map
+        self.players = game_state.players # Only read, to resolve city ownership
+        self.cities = _BudgetCities(game_state.cities, refill_action_points)
+        self.turn = game_state.turn
+
+
+@dataclass
+class QueueValidation:
+    """Per-action verdicts for a queue and the budget of every city it touched."""
+    results: List[ActionResult] = field(default_factory=list)
+    budgets: Dict[str, CityBudget] = field(default_factory=dict)
+
+    @property
+    def is_valid(self) -> bool:
+        return all(self.results)
+
+    @property
+    def failed_indices(self) -> List[int]:
+        return [i for i, result in enumerate(self.results) if not result]
+
+    def to_dict(self) -> dict:
+        return {
+            'results': [result.to_dict() for result in self.results],
+            'budgets': {city_id: budget.to_dict() for city_id, budget in self.budgets.items()},
+        }
+
+
+def validate_queue(game_state, actions: List[Action], refill_action_points: bool = False) -> QueueValidation:
+    """
+    Checks every action of a queue, in order, as if it were executed. A failed
+    action does not spend anything, exactly like during a real turn.
+
+    Set `refill_action_points` to validate orders for the next turn, which
+    starts by refilling every city's action points.
+    """
+    budget_state = _BudgetState(game_state, refill_action_points)
+    results = [action.execute(budget_state) for action in actions]
+    return QueueValidation(results, budget_state.cities.budgets)
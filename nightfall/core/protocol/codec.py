@@ -0,0 +1,322 @@
+"""
+Wire codecs for client/server messages.
+
+A codec turns message dicts into framed bytes and reads them back from a
+buffered binary stream. Every connection starts with `JsonCodec`
+(newline-delimited JSON, the original protocol). A client may then send
+
+    {"command": "hello", "payload": {"codecs": ["binary", "json"], "features": ["map_refs"]}}
+
+and the server answers, still in JSON, with
+
+    {"type": "hello", "payload": {"codec": "<chosen name>", "features": [<accepted features>]}}
+
+after which both sides use the chosen codec. Clients that never send a hello
+keep talking JSON and get no optional features.
+
+Features:
+    map_refs    State messages carry the world map as a content hash reference
+                (GameMap.to_dict(map_format='ref')); the client fetches unknown
+                maps with the 'get_map' command.
+
+`BinaryCodec` frames each message with a 4-byte length and encodes values with
+type tags: integers as zigzag varints, strings once per message and then as
+back-references (so repeated keys and enum names cost one or two bytes), and
+raw bytes as-is. Game states are sent with map_format='grids', so tile grids
+travel as packed byte strings.
+"""
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import struct
+from typing import BinaryIO, Callable, Dict, Iterable, Optional
+
+HELLO_COMMAND = "hello"
+FEATURE_MAP_REFS = "map_refs"
+# Optional protocol features this version understands
+FEATURES = (FEATURE_MAP_REFS,)
+
+
+class PreparedMessage:
+    """
+    A message encoded once, except for one top-level key whose value is
+    spliced in by `frame`. Used to send the same large message to many
+    recipients while only re-encoding a small, changing section.
+    """
+    def __init__(self, frame: Callable[[object], bytes]):
+        self._frame = frame
+
+    def frame(self, value) -> bytes:
+        """The framed message with `value` under the spliced key."""
+        return self._frame(value)
+
+
+class Codec(ABC):
+    """Base class of the wire codecs."""
+    name = ''
+    # How GameState.to_dict should write maps for this codec
+    map_format = 'tiles'
+
+    @abstractmethod
+    def encode(self, message: dict) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: bytes) -> dict:
+        pass
+
+    @abstractmethod
+    def frame(self, message: dict) -> bytes:
+        """Encodes a message together with its framing, ready to be written to the socket."""
+        pass
+
+    @abstractmethod
+    def read_message(self, reader: BinaryIO) -> Optional[dict]:
+        """Reads the next framed message. Returns None when the stream is closed."""
+        pass
+
+    @abstractmethod
+    async def read_frame_async(self, reader: asyncio.StreamReader, max_size: int) -> Optional[bytes]:
+        """
+        Reads the next frame from an asyncio stream, undecoded and including its
+        framing (e.g. to relay it as-is). Returns None when the stream is closed.
+        Frames larger than `max_size` raise ValueError (for JSON lines the
+        stream's own limit applies).
+        """
+        pass
+
+    @abstractmethod
+    def decode_frame(self, frame: bytes) -> dict:
+        """Decodes a frame returned by read_frame_async."""
+        pass
+
+    async def read_message_async(self, reader: asyncio.StreamReader, max_size: int) -> Optional[dict]:
+        """Like read_message, for an asyncio stream."""
+        frame = await self.read_frame_async(reader, max_size)
+        return None if frame is None else self.decode_frame(frame)
+
+    @abstractmethod
+    def prepare(self, message: dict, spliced_key: str) -> PreparedMessage:
+        """Encodes `message` now; `spliced_key` (not in the message) is added by each PreparedMessage.frame call."""
+        pass
+
+
+class JsonCodec(Codec):
+    """Newline-delimited JSON."""
+    name = 'json'
+
+    def encode(self, message: dict) -> bytes:
+        return json.dumps(message).encode('utf-8')
+
+    def decode(self, data: bytes) -> dict:
+        return json.loads(data)
+
+    def frame(self, message: dict) -> bytes:
+        return self.encode(message) + b'\n'
+
+    def read_message(self, reader: BinaryIO) -> Optional[dict]:
+        line = reader.readline()
+        if not line:
+            return None
+        return self.decode(line)
+
+    async def read_frame_async(self, reader: asyncio.StreamReader, max_size: int) -> Optional[bytes]:
+        line = await reader.readline()
+        return line or None
+
+    def decode_frame(self, frame: bytes) -> dict:
+        return self.decode(frame)
+
+    def prepare(self, message: dict, spliced_key: str) -> PreparedMessage:
+        # Re-open the encoded object and append the key; each frame adds the value and closes it.
+        head = self.encode(message)[:-1] + (b', ' if message else b'') + json.dumps(spliced_key).encode('utf-8') + b': '
+        return PreparedMessage(lambda value: head + self.encode(value) + b'}\n')
+
+
+# Value tags of the binary encoding
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _STR_REF, _BYTES, _LIST, _DICT = range(10)
+_LENGTH = struct.Struct('>I')
+_FLOAT64 = struct.Struct('>d')
+
+
+def _write_varint(out: bytearray, value: int):
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+class _Encoder:
+    def __init__(self):
+        self.out = bytearray()
+        self.strings: Dict[str, int] = {}
+
+    def write(self, value):
+        out = self.out
+        if value is None:
+            out.append(_NONE)
+        elif value is True:
+            out.append(_TRUE)
+        elif value is False:
+            out.append(_FALSE)
+        elif isinstance(value, int):
+            out.append(_INT)
+            _write_varint(out, (value << 1) if value >= 0 else ((-value << 1) - 1))
+        elif isinstance(value, float):
+            out.append(_FLOAT)
+            out += _FLOAT64.pack(value)
+        elif isinstance(value, str):
+            index = self.strings.get(value)
+            if index is not None:
+                out.append(_STR_REF)
+                _write_varint(out, index)
+            else:
+                self.strings[value] = len(self.strings)
+                data = value.encode('utf-8')
+                out.append(_STR)
+                _write_varint(out, len(data))
+                out += data
+        elif isinstance(value, (bytes, bytearray, memoryview)):
+            out.append(_BYTES)
+            _write_varint(out, len(value))
+            out += value
+        elif isinstance(value, (list, tuple)):
+            out.append(_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                self.write(item)
+        elif isinstance(value, dict):
+            out.append(_DICT)
+            _write_varint(out, len(value))
+            for key, item in value.items():
+                self.write(key)
+                self.write(item)
+        else:
+            raise TypeError(f"Cannot encode a value of type {type(value).__name__}.")
+
+
+class _Decoder:
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.offset = 0
+        self.strings = []
+
+    def read_varint(self) -> int:
+        data = self.data
+        result = shift = 0
+        while True:
+            byte = data[self.offset]
+            self.offset += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def read(self):
+        tag = self.data[self.offset]
+        self.offset += 1
+        if tag == _INT:
+            value = self.read_varint()
+            return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+        if tag == _STR_REF:
+            return self.strings[self.read_varint()]
+        if tag == _STR:
+            length = self.read_varint()
+            value = str(self.data[self.offset:self.offset + length], 'utf-8')
+            self.offset += length
+            self.strings.append(value)
+            return value
+        if tag == _DICT:
+            return {self.read(): self.read() for _ in range(self.read_varint())}
+        if tag == _LIST:
+            return [self.read() for _ in range(self.read_varint())]
+        if tag == _BYTES:
+            length = self.read_varint()
+            value = bytes(self.data[self.offset:self.offset + length])
+            self.offset += length
+            return value
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _FLOAT:
+            value = _FLOAT64.unpack_from(self.data, self.offset)[0]
+            self.offset += _FLOAT64.size
+            return value
+        raise ValueError(f"Unknown value tag {tag} at offset {self.offset - 1}.")
+
+
+class BinaryCodec(Codec):
+    """Length-prefixed frames of tagged binary values."""
+    name = 'binary'
+    map_format = 'grids'
+
+    def encode(self, message: dict) -> bytes:
+        encoder = _Encoder()
+        encoder.write(message)
+        return bytes(encoder.out)
+
+    def decode(self, data: bytes) -> dict:
+        return _Decoder(data).read()
+
+    def frame(self, message: dict) -> bytes:
+        data = self.encode(message)
+        return _LENGTH.pack(len(data)) + data
+
+    def prepare(self, message: dict, spliced_key: str) -> PreparedMessage:
+        encoder = _Encoder()
+        encoder.out.append(_DICT)
+        _write_varint(encoder.out, len(message) + 1)
+        for key, item in message.items():
+            encoder.write(key)
+            encoder.write(item)
+        encoder.write(spliced_key)
+        head, strings = bytes(encoder.out), encoder.strings
+
+        def frame(value) -> bytes:
+            # The value may refer back to strings of the head, so it continues its string table.
+            tail_encoder = _Encoder()
+            tail_encoder.strings = dict(strings)
+            tail_encoder.write(value)
+            return _LENGTH.pack(len(head) + len(tail_encoder.out)) + head + tail_encoder.out
+
+        return PreparedMessage(frame)
+
+    def read_message(self, reader: BinaryIO) -> Optional[dict]:
+        header = reader.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return None
+        (length,) = _LENGTH.unpack(header)
+        data = reader.read(length)
+        if len(data) < length:
+            return None
+        return self.decode(data)
+
+    async def read_frame_async(self, reader: asyncio.StreamReader, max_size: int) -> Optional[bytes]:
+        try:
+            header = await reader.readexactly(_LENGTH.size)
+            (length,) = _LENGTH.unpack(header)
+            if length > max_size:
+                raise ValueError(f"Frame of {length} bytes exceeds the limit of {max_size}.")
+            return header + await reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            return None
+
+    def decode_frame(self, frame: bytes) -> dict:
+        return self.decode(frame[_LENGTH.size:])
+
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+# Supported codecs by name, in order of preference
+CODECS: Dict[str, Codec] = {BINARY_CODEC.name: BINARY_CODEC, JSON_CODEC.name: JSON_CODEC}
+
+
+def negotiate(offered: Iterable[str]) -> Codec:
+    """Picks the first codec offered by the client that is supported here, falling back to JSON."""
+    for name in offered or ():
+        if name in CODECS:
+            return CODECS[name]
+    return JSON_CODEC
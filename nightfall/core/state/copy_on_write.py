@@ -0,0 +1,63 @@
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Mapping, Set
+
+
+class CopyOnWriteDict(MutableMapping):
+    """
+    A dictionary layered over a base mapping that is never modified.
+
+    Values are cloned from the base the first time they are looked up through
+    this mapping, so callers can freely mutate what they get back while the
+    base keeps its original objects. Values that are never looked up stay
+    shared. Overlays can be stacked; a lookup peeks through parent overlays
+    without forcing them to clone anything.
+
+    The base must not be mutated while the overlay is in use.
+    """
+    def __init__(self, base: Mapping, clone: Callable):
+        self._base = base
+        self._clone = clone
+        self._local: Dict = {}
+        self._deleted: Set = set()
+
+    def peek(self, key):
+        """Returns the current value for `key` without cloning it."""
+        if key in self._local:
+            return self._local[key]
+        if key in self._deleted:
+            raise KeyError(key)
+        if isinstance(self._base, CopyOnWriteDict):
+            return self._base.peek(key)
+        return self._base[key]
+
+    def __getitem__(self, key):
+        if key in self._local:
+            return self._local[key]
+        value = self._clone(self.peek(key))
+        self._local[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._local[key] = value
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._local.pop(key, None)
+        if key in self._base:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        return key in self._local or (key not in self._deleted and key in self._base)
+
+    def __iter__(self):
+        for key in self._base:
+            if key not in self._deleted:
+                yield key
+        for key in self._local:
+            if key not in self._base:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
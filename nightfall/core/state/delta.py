@@ -0,0 +1,126 @@
+"""
+Structural patches between two versions of a game state.
+
+The server keeps a snapshot of the state it last broadcast (the output of
+`GameState.to_dict(map_format='grids')`) and, after a turn, sends clients only
+what changed since that snapshot:
+
+    {
+        'base_version': 3, 'version': 4, 'turn': 52,
+        'players': {player_id: <full Player dict>},        # changed players
+        'removed_players': [player_id, ...],
+        'cities': {city_id: {'fields': {...},               # changed City.to_dict fields
+                             'tiles': [[x, y, terrain, building_type | None, level], ...]}
+                   | {'city': <full City dict>}},           # new (or resized) cities
+        'removed_cities': [city_id, ...],
+    }
+
+`apply_patch` updates a GameState in place. A patch only applies to the state
+at `base_version`; clients holding another version must ask for a full state.
+
+The orders players have queued for the next turn travel next to the state
+(or patch) as a complete `action_queues` mapping; see `apply_action_queues`.
+"""
+from typing import Dict, List, Optional
+from nightfall.core.actions.action import Action
+from nightfall.core.common.enums import BuildingType, CityTerrainType
+from nightfall.core.components.city import Building, City, CityMap
+from nightfall.core.components.map import GameMap
+from nightfall.core.components.player import Player
+
+
+def _convert_city_map(city_map_data: dict, map_format: str) -> dict:
+    return CityMap.from_dict(city_map_data).to_dict(map_format)
+
+
+def _changed_tiles(old_map: dict, new_map: dict) -> List[list]:
+    """Tiles that differ between two city maps of the same size, in the 'grids' format."""
+    old_grids, new_grids = old_map['grids'], new_map['grids']
+    if old_grids == new_grids:
+        return []
+    size = new_map['width'] * new_map['height']
+    city_map = CityMap.from_dict(new_map)
+    tiles = []
+    for index in range(size):
+        if any(old_grids[index + offset] != new_grids[index + offset] for offset in (0, size, 2 * size)):
+            x, y = divmod(index, new_map['height'])
+            tile = city_map.get_tile(x, y)
+            building = tile.building
+            tiles.append([
+                x, y, tile.terrain.name,
+                building.type.name if building else None,
+                building.level if building else 0
+            ])
+    return tiles
+
+
+def diff_states(old: dict, new: dict, map_format: str = 'tiles') -> dict:
+    """
+    Returns the patch that turns the `old` snapshot into `new`. Both are
+    `GameState.to_dict(map_format='grids')` outputs; maps that have to be sent
+    whole are converted to `map_format`. Versions are added by the caller.
+    """
+    patch = {
+        'turn': new['turn'],
+        'players': {},
+        'removed_players': [pid for pid in old['players'] if pid not in new['players']],
+        'cities': {},
+        'removed_cities': [cid for cid in old['cities'] if cid not in new['cities']],
+    }
+    if old['game_map'] != new['game_map']:
+        patch['game_map'] = GameMap.from_dict(new['game_map']).to_dict(map_format)
+
+    for pid, player_data in new['players'].items():
+        if old['players'].get(pid) != player_data:
+            patch['players'][pid] = player_data
+
+    for cid, city_data in new['cities'].items():
+        old_city = old['cities'].get(cid)
+        if old_city == city_data:
+            continue
+        old_map, new_map = (old_city or {}).get('city_map'), city_data['city_map']
+        if old_city is None or (old_map['width'], old_map['height']) != (new_map['width'], new_map['height']):
+            patch['cities'][cid] = {'city': dict(city_data, city_map=_convert_city_map(new_map, map_format))}
+            continue
+        fields = {key: value for key, value in city_data.items() if key != 'city_map' and old_city.get(key) != value}
+        tiles = _changed_tiles(old_map, new_map)
+        patch['cities'][cid] = {'fields': fields, 'tiles': tiles}
+    return patch
+
+
+def apply_patch(game_state, patch: dict, action_class_map: Optional[Dict] = None):
+    """Applies a patch from diff_states to a game state, in place."""
+    action_class_map = action_class_map if action_class_map is not None else game_state.ACTION_CLASS_MAP
+    game_state.turn = patch['turn']
+    if 'game_map' in patch:
+        game_state.game_map = GameMap.from_dict(patch['game_map'])
+
+    for pid in patch.get('removed_players', []):
+        game_state.players.pop(pid, None)
+    for pid, player_data in patch.get('players', {}).items():
+        game_state.players[pid] = Player.from_dict(player_data, action_class_map)
+
+    for cid in patch.get('removed_cities', []):
+        game_state.cities.pop(cid, None)
+    for cid, city_patch in patch.get('cities', {}).items():
+        if 'city' in city_patch:
+            game_state.cities[cid] = City.from_dict(city_patch['city'], action_class_map)
+            continue
+        city = game_state.cities[cid]
+        city.update_from_dict(city_patch.get('fields', {}), action_class_map)
+        tiles = city_patch.get('tiles', [])
+        for x, y, terrain, building_type, level in tiles:
+            tile = city.city_map.get_tile_for_update(x, y)
+            tile.terrain = CityTerrainType[terrain]
+            tile.building = Building(BuildingType[building_type], level) if building_type else None
+        if tiles:
+            city.update_stats_from_citadel()
+            city.recalculate_production()
+
+
+def apply_action_queues(game_state, action_queues: dict, action_class_map: Optional[Dict] = None):
+    """Sets the action queues of the given players from lists of action dicts."""
+    action_class_map = action_class_map if action_class_map is not None else game_state.ACTION_CLASS_MAP
+    for pid, queue in action_queues.items():
+        if pid in game_state.players:
+            game_state.players[pid].action_queue = [Action.from_dict(a, action_class_map) for a in queue]
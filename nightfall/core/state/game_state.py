@@ -1,11 +1,18 @@
 import json
 import copy
-from typing import Dict, Type
+import gzip
+from typing import Dict, Mapping, Optional, Type
 from nightfall.core.components.map import GameMap
 from nightfall.core.components.player import Player
 from nightfall.core.components.city import City, CityMap
 from nightfall.core.actions.action import Action
 from nightfall.core.actions.city_actions import BuildBuildingAction, UpgradeBuildingAction, DemolishAction
+from nightfall.core.state.copy_on_write import CopyOnWriteDict
+
+# Identifies files written by GameState.save_to_file. Bump the version when the layout changes.
+SAVE_FORMAT = 'nightfall-save'
+SAVE_VERSION = 1
+GZIP_MAGIC = b'\x1f\x8b'
 
 class GameState:
     """
@@ -18,25 +25,32 @@ class GameState:
         'DemolishAction': DemolishAction,
     }
 
-    def __init__(self, game_map: GameMap, players: Dict[str, Player], cities: Dict[str, City], turn: int = 0):
+    def __init__(self, game_map: GameMap, players: Mapping[str, Player], cities: Mapping[str, City], turn: int = 0):
         self.game_map = game_map
         self.players = players
         self.cities = cities
         self.turn = turn
 
-    def to_dict(self) -> dict:
-        """Serializes the core game state components to a dictionary."""
-        return {
+    def to_dict(self, include_map: bool = True, map_format: str = 'tiles') -> dict:
+        """
+        Serializes the core game state components to a dictionary.
+        With include_map=False the game map is left out; pass it to from_dict instead.
+        `map_format` selects how the world and city maps are written (see GameMap.to_dict).
+        """
+        data = {
             'turn': self.turn,
-            'game_map': self.game_map.to_dict(),
             'players': {p_id: p.to_dict() for p_id, p in self.players.items()},
-            'cities': {c_id: c.to_dict() for c_id, c in self.cities.items()}
+            'cities': {c_id: c.to_dict(map_format) for c_id, c in self.cities.items()}
         }
+        if include_map:
+            data['game_map'] = self.game_map.to_dict(map_format)
+        return data
 
     @classmethod
-    def from_dict(cls, data: dict) -> 'GameState':
-        """Deserializes a game state from a dictionary."""
-        game_map = GameMap.from_dict(data['game_map'])
+    def from_dict(cls, data: dict, game_map: Optional[GameMap] = None) -> 'GameState':
+        """Deserializes a game state from a dictionary, reusing `game_map` if given."""
+        if game_map is None:
+            game_map = GameMap.from_dict(data['game_map'])
         players = {p_id: Player.from_dict(p_data, cls.ACTION_CLASS_MAP) for p_id, p_data in data['players'].items()}
         cities = {c_id: City.from_dict(c_data, cls.ACTION_CLASS_MAP) for c_id, c_data in data['cities'].items()}
         
@@ -52,27 +66,71 @@ class GameState:
         data = json.loads(json_str)
         return cls.from_dict(data)
 
-    def save_to_file(self, filepath: str):
-        """Serializes the entire game state to a JSON file."""
+    def save_to_file(self, filepath: str, compress: Optional[bool] = None):
+        """
+        Saves the game state in the compact save format: run-length encoded
+        terrain rows and sparse building lists, without indentation. The file
+        is gzip-compressed if `compress` is set or, by default, if the path
+        ends in '.gz'. Use export_json for a readable file.
+        """
+        payload = json.dumps(self.to_save_dict(), separators=(',', ':')).encode('utf-8')
+        if compress is None:
+            compress = str(filepath).endswith('.gz')
+        if compress:
+            payload = gzip.compress(payload)
+        with open(filepath, 'wb') as f:
+            f.write(payload)
+        print(f"Game state saved to {filepath}")
+
+    def to_save_dict(self) -> dict:
+        """The game state as written by save_to_file, before JSON encoding."""
+        data = {'format': SAVE_FORMAT, 'version': SAVE_VERSION}
+        data.update(self.to_dict(map_format='compact'))
+        return data
+
+    @classmethod
+    def from_save_dict(cls, data: dict, game_map: Optional[GameMap] = None) -> 'GameState':
+        """Inverse of to_save_dict. Raises ValueError for saves from a newer version."""
+        if data.get('version', 0) > SAVE_VERSION:
+            raise ValueError(f"Version {data['version']} saves are not supported; "
+                             f"only versions up to {SAVE_VERSION} are.")
+        return cls.from_dict(data, game_map)
+
+    def export_json(self, filepath: str):
+        """Writes the game state as readable, indented JSON (one object per tile)."""
         with open(filepath, 'w') as f:
             json.dump(self.to_dict(), f, indent=4)
-        print(f"Game state saved to {filepath}")
+        print(f"Game state exported to {filepath}")
 
     @classmethod
     def load_from_file(cls, filepath: str) -> 'GameState':
         """
-        Loads a game state from a JSON file.
+        Loads a game state from a compact save (optionally gzip-compressed) or
+        from a JSON export. The format is detected from the file contents.
         """
-        with open(filepath, 'r') as f:
-            data = json.load(f)
-        
+        with open(filepath, 'rb') as f:
+            payload = f.read()
+        if payload[:2] == GZIP_MAGIC:
+            payload = gzip.decompress(payload)
+        data = json.loads(payload)
+
+        is_save = data.get('format') == SAVE_FORMAT
+        if is_save and data.get('version', 0) > SAVE_VERSION:
+            raise ValueError(f"{filepath} is a version {data['version']} save; "
+                             f"only versions up to {SAVE_VERSION} are supported.")
+
         game_state = cls.from_dict(data)
         print(f"Loaded game state from {filepath} at turn {game_state.turn}")
+        if is_save:
+            return game_state
 
-        # Overwrite the city layout from the text file
+        # JSON exports are used as scenarios: overwrite the city layout from the text file
         city_layout_path = 'nightfall/server/data/city_layout.txt'
         if 'city1' in game_state.cities:
-            game_state.cities['city1'].city_map = CityMap.load_from_file(city_layout_path)
+            city = game_state.cities['city1']
+            city.city_map = CityMap.load_from_file(city_layout_path)
+            city.update_stats_from_citadel()
+            city.recalculate_production()
             print(f"Overwrote 'city1' map with layout from {city_layout_path}")
 
         return game_state
@@ -83,5 +141,23 @@ class GameState:
         A simple and effective way to deep copy is to serialize and deserialize.
         """
         # Using to_dict and from_dict is faster than JSON string conversion for in-memory copies.
-        data_copy = copy.deepcopy(self.to_dict())
-        return GameState.from_dict(data_copy)
+        # The game map is immutable, so the copy shares it.
+        data_copy = copy.deepcopy(self.to_dict(include_map=False))
+        return GameState.from_dict(data_copy, self.game_map)
+
+
+    def overlay(self) -> 'GameState':
+        """
+        Creates a copy-on-write view of this state for simulations.
+        The game map is shared, and players and cities are only cloned when they
+        are first looked up in the overlay; city maps in turn copy their grids
+        only when an action first modifies them. The cost is proportional to what the
+        simulation touches rather than to the size of the world.
+        This state must not be modified while the overlay is in use.
+        """
+        return GameState(
+            self.game_map,
+            CopyOnWriteDict(self.players, Player.copy_on_write),
+            CopyOnWriteDict(self.cities, City.copy_on_write),
+            self.turn
+        )
@@ -0,0 +1,68 @@
+"""
+Scenario templates shared between game sessions.
+
+Loading a scenario parses its files once; every session started from it gets
+a GameState that shares the template's immutable GameMap and holds cheap
+copies of the mutable parts (players and cities, whose city maps are shared
+copy-on-write). Equal world maps are also deduplicated across scenarios.
+"""
+import os
+import threading
+import weakref
+from typing import Dict, Tuple
+from nightfall.core.components.map import GameMap
+from nightfall.core.components.player import Player
+from nightfall.core.state.game_state import GameState
+
+_lock = threading.Lock()
+_templates: Dict[Tuple[str, int], 'ScenarioTemplate'] = {}
+_shared_maps: 'weakref.WeakValueDictionary[Tuple[int, int, bytes], GameMap]' = weakref.WeakValueDictionary()
+
+
+def share_game_map(game_map: GameMap) -> GameMap:
+    """Returns the shared instance of a map with the same contents, registering `game_map` if there is none."""
+    key = (game_map.width, game_map.height, game_map.to_bytes())
+    with _lock:
+        shared = _shared_maps.get(key)
+        if shared is None:
+            _shared_maps[key] = shared = game_map
+        return shared
+
+
+class ScenarioTemplate:
+    """A parsed scenario. It must never be modified; sessions play on the states from `new_state`."""
+    def __init__(self, state: GameState):
+        self._state = GameState(share_game_map(state.game_map), state.players, state.cities, state.turn)
+
+    @property
+    def game_map(self) -> GameMap:
+        return self._state.game_map
+
+    def new_state(self) -> GameState:
+        """Returns a fresh game state for a session started from this scenario."""
+        template = self._state
+        players = {
+            p_id: Player(player.name, list(player.city_ids), list(player.action_queue))
+            for p_id, player in template.players.items()
+        }
+        cities = {c_id: city.copy_on_write() for c_id, city in template.cities.items()}
+        return GameState(template.game_map, players, cities, template.turn)
+
+
+def load_scenario(filepath: str) -> ScenarioTemplate:
+    """
+    Returns the template for a scenario file, parsing it only the first time
+    (or again after the file changed on disk).
+    """
+    path = os.path.abspath(filepath)
+    key = (path, os.stat(path).st_mtime_ns)
+    with _lock:
+        template = _templates.get(key)
+    if template is None:
+        template = ScenarioTemplate(GameState.load_from_file(path))
+        with _lock:
+            # Another thread may have loaded it meanwhile; keep the first one.
+            template = _templates.setdefault(key, template)
+            for stale_key in [k for k in _templates if k[0] == path and k != key]:
+                del _templates[stale_key]
+    return template
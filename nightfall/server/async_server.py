@@ -0,0 +1,89 @@
+"""
+asyncio front end for the game server.
+
+Each connection is a task reading from an asyncio stream rather than an OS
+thread blocked on a socket, so idle lobby clients cost a few kilobytes each.
+Commands still run the same `ClientConnection.process_command` as the threaded
+server, on a small thread pool: most only queue work for a session's worker,
+but some take locks or do real work (creating a session builds its state),
+which must not block the event loop. A second task per connection writes out
+the connection's outbox, waiting for the transport to drain so that at most
+one transport buffer per client is held beyond the outbox.
+"""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from nightfall.server.connection import ClientConnection
+
+# Largest message accepted from a client
+MAX_MESSAGE_BYTES = 1 << 20
+# Pending connections the listening socket holds before accept
+LISTEN_BACKLOG = 1024
+
+
+class AsyncConnection(ClientConnection):
+    """A client served by an asyncio stream. Frames may be queued from any thread."""
+    def __init__(self, master, client_address, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        super().__init__(master, client_address)
+        self.writer = writer
+        self.loop = loop
+        self.wakeup = asyncio.Event()
+
+    def notify_writer(self):
+        self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def close(self):
+        self.outbox.close()
+        self.loop.call_soon_threadsafe(self.writer.transport.abort)
+
+    async def drain_outbox(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            frames = self.outbox.take(block=False)
+            if frames is None:
+                return
+            if frames:
+                try:
+                    self.writer.write(b''.join(frames))
+                    await self.writer.drain()
+                except ConnectionError:
+                    self.close()
+                    return
+
+
+async def handle_connection(master, executor: Executor, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    connection = AsyncConnection(master, writer.get_extra_info('peername'), writer, loop)
+    writer_task = asyncio.create_task(connection.drain_outbox())
+    print(f"Connection from {connection.client_address}")
+    try:
+        while True:
+            data = await connection.codec.read_message_async(reader, MAX_MESSAGE_BYTES)
+            if data is None: break
+
+            await loop.run_in_executor(executor, connection.process_command, data)
+    except (ConnectionError, ValueError) as e:
+        print(f"Client {connection.client_address} ({connection.player_id}) disconnected abruptly: {e}")
+    finally:
+        await loop.run_in_executor(executor, connection.cleanup_connection)
+        writer_task.cancel()
+        writer.close()
+
+
+async def serve(master, host: str, port: int, executor: Executor):
+    server = await asyncio.start_server(
+        partial(handle_connection, master, executor), host, port,
+        limit=MAX_MESSAGE_BYTES, backlog=LISTEN_BACKLOG
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def run(master, host: str, port: int, command_threads: int):
+    """Serves clients until interrupted, running their commands on `command_threads` threads."""
+    executor = ThreadPoolExecutor(max_workers=command_threads, thread_name_prefix="commands")
+    try:
+        asyncio.run(serve(master, host, port, executor))
+    finally:
+        executor.shutdown(wait=False)
@@ -0,0 +1,238 @@
+import re
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import List, Optional
+from nightfall.core.protocol.codec import FEATURES, HELLO_COMMAND, JSON_CODEC, negotiate
+
+# Kinds of queued frames
+MESSAGE, STATE_PATCH, FULL_STATE = range(3)
+# Unsent bytes a client may accumulate before it is disconnected as too slow
+MAX_QUEUED_BYTES = 8 << 20
+
+
+# Session IDs chosen by clients must match this; they are used as file names
+SESSION_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def new_session_id() -> str:
+    """A new unique session ID."""
+    return str(uuid.uuid4())[:8]
+
+
+def is_valid_session_id(session_id) -> bool:
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+
+class OutboundQueue:
+    """
+    Framed messages waiting to be written to one client, bounded in bytes.
+
+    Game states are coalesced: a full state replaces any state or patch still
+    waiting in the queue, taking the place of the first one, so a slow client
+    skips to the latest version instead of receiving every turn, and messages
+    queued after a state (such as its turn report) still arrive after one. Once the queue holds more than `max_bytes` anyway,
+    it closes and the client is to be disconnected.
+    """
+    def __init__(self, max_bytes: int = MAX_QUEUED_BYTES):
+        self.max_bytes = max_bytes
+        self.frames = deque() # (kind, frame)
+        self.queued_bytes = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def put(self, frame: bytes, kind: int = MESSAGE) -> bool:
+        """Queues a frame. Returns False if this made the queue overflow (and close)."""
+        with self.condition:
+            if self.closed:
+                return True
+            if kind == FULL_STATE and self._has_state():
+                kept = deque()
+                replaced = False
+                for item in self.frames:
+                    if item[0] == MESSAGE:
+                        kept.append(item)
+                    elif not replaced: # The new state goes where the first outdated one was
+                        kept.append((kind, frame))
+                        replaced = True
+                self.frames = kept
+                self.queued_bytes = sum(len(f) for _, f in kept)
+            else:
+                self.frames.append((kind, frame))
+                self.queued_bytes += len(frame)
+            if self.queued_bytes > self.max_bytes:
+                self.closed = True
+                self.frames.clear()
+                self.queued_bytes = 0
+            self.condition.notify()
+            return not self.closed
+
+    def _has_state(self) -> bool:
+        return any(kind != MESSAGE for kind, _ in self.frames)
+
+    def has_pending_state(self) -> bool:
+        """Whether a state or patch has not been handed to the writer yet."""
+        with self.condition:
+            return self._has_state()
+
+    def take(self, block: bool = True) -> Optional[List[bytes]]:
+        """
+        Removes and returns all queued frames, waiting for at least one if
+        `block`. Returns None once the queue is closed.
+        """
+        with self.condition:
+            while block and not self.frames and not self.closed:
+                self.condition.wait()
+            if self.closed:
+                return None
+            frames = [frame for _, frame in self.frames]
+            self.frames.clear()
+            self.queued_bytes = 0
+            return frames
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.frames.clear()
+            self.queued_bytes = 0
+            self.condition.notify()
+
+
+class ClientConnection(ABC):
+    """
+    The protocol state of one connected client and the handling of its
+    commands, independent of how bytes reach the socket. Each server front end
+    reads messages with `codec` and passes them to `process_command`; outgoing
+    frames go to `outbox`, which the front end drains with its own writer so
+    that senders (e.g. a session worker broadcasting a turn) never wait on the
+    socket. Sessions keep these objects as their client handlers.
+    """
+    def __init__(self, master, client_address):
+        self.master = master # The MasterServer holding the sessions
+        self.client_address = client_address
+        self.player_id = None
+        self.session = None
+        self.codec = JSON_CODEC # Until the client negotiates another one with 'hello'
+        self.state_version = None # Version of the session state this client holds
+        self.features = set() # Optional protocol features agreed on in 'hello'
+        self.outbox = OutboundQueue()
+
+    @abstractmethod
+    def notify_writer(self):
+        """Called after frames were queued. Front ends whose writer does not wait on the outbox wake it here."""
+        pass
+
+    @abstractmethod
+    def close(self):
+        """Drops the connection, e.g. when the client does not keep up with its messages."""
+        pass
+
+    def cleanup_connection(self):
+        print(f"Client {self.client_address} ({self.player_id}) disconnected.")
+        self.outbox.close()
+        self.notify_writer()
+        if self.session and self.player_id:
+            self.session.remove_player(self.player_id, self)
+
+    def process_command(self, data):
+        command = data.get("command")
+        
+        if not self.session: # Initial commands before being in a session
+            if command == HELLO_COMMAND:
+                hello = data.get("payload", {})
+                codec = negotiate(hello.get("codecs", []))
+                self.features = set(hello.get("features", [])) & set(FEATURES)
+                # The reply is still sent with the current codec; the switch happens after it.
+                self.send_message({"type": "hello", "payload": {"codec": codec.name, "features": sorted(self.features)}})
+                self.codec = codec
+
+            elif command == "list_sessions":
+                sessions_info = self.master.list_sessions()
+                response = {"type": "session_list", "payload": sessions_info}
+                self.send_message(response)
+                return
+
+            elif command == "stats":
+                self.send_stats()
+
+            elif command == "create_session":
+                self.player_id = data.get("player_id", "player1")
+                options = data.get("payload") or {}
+                turn_seconds = options.get("turn_seconds")
+                if turn_seconds is not None and (not isinstance(turn_seconds, (int, float)) or turn_seconds < 0):
+                    self.send_response({"status": "error", "message": "turn_seconds must be a number of seconds (0 for no limit)."})
+                    return
+                # A router placing sessions on shards picks the ID itself
+                session_id = options.get("session_id")
+                if session_id is not None and not is_valid_session_id(session_id):
+                    self.send_response({"status": "error", "message": "session_id may only contain letters, digits, '_' and '-'."})
+                    return
+                self.session = self.master.create_session(self.player_id, self, session_id, turn_seconds)
+                if not self.session:
+                    self.send_response({"status": "error", "message": f"Session '{session_id}' already exists."})
+                    return
+                # The session sends the 'initial_state' the client expects, then the ack
+                self.session.handle_new_player(self.player_id, self, f"Created and joined session {self.session.session_id}")
+
+            elif command == "join_session":
+                payload = data.get("payload", {})
+                session_id = payload.get("session_id")
+                self.player_id = payload.get("player_id", f"player{int(time.time()) % 1000}")
+                session = self.master.join_session(session_id, self.player_id, self, f"Joined session {session_id}")
+                if session:
+                    self.session = session
+                else:
+                    err_msg = {"type": "error", "payload": {"message": f"Session '{session_id}' not found."}}
+                    self.send_message(err_msg)
+        else: # In-game commands, delegate to the session. Its worker sends the replies.
+            self.session.record_message_received()
+            player_id = data.get("player_id")
+            payload = data.get("payload")
+
+            if command == "stats":
+                self.send_stats()
+                return
+            elif command == "resync": # The client missed a version and needs the full state
+                self.session.send_full_state(self)
+                return
+            elif command == "get_map": # The client does not have the map referenced by a state message
+                content_hash = (payload or {}).get("hash")
+                message = self.session.map_message(content_hash, self.codec.map_format)
+                self.send_message(message or {"type": "error", "payload": {"message": f"Unknown map '{content_hash}'."}})
+                return
+            elif command == "set_orders":
+                self.session.handle_set_orders(player_id, payload, self)
+            elif command == "ready":
+                self.session.handle_ready(player_id, self)
+            elif command == "leave_session":
+                self.session.remove_player(player_id, self)
+                self.session = None # Detach handler from session
+                # No need to send ack, client handles state change locally
+            elif command == "join_session": # Player is already in a session, cannot join another
+                self.send_response({"status": "error", "message": "Already in a session."})
+            else:
+                self.send_response({"status": "error", "message": "Unknown command"})
+
+    def send_response(self, response_data: dict):
+        """Sends a command's {'status', 'message'} result as the ack/error message the client expects."""
+        response_type = "ack" if response_data.get("status") == "success" else "error"
+        self.send_message({"type": response_type, "payload": {"message": response_data.get("message")}})
+
+    def send_stats(self):
+        response = {"type": "stats", "payload": self.master.get_stats()}
+        self.send_message(response)
+
+    def send_message(self, message: dict):
+        self.send_frame(self.codec.frame(message))
+
+    def send_frame(self, data: bytes, kind: int = MESSAGE):
+        """Queues a message already encoded and framed with this connection's codec."""
+        if not self.outbox.put(data, kind):
+            print(f"Client {self.client_address} ({self.player_id}) is not reading its messages; disconnecting.")
+            self.close()
+            return
+        self.notify_writer()
+        if self.session:
+            self.session.record_message_sent(len(data))
@@ -0,0 +1,163 @@
+"""
+Crash recovery for running sessions: an append-only journal per session plus
+periodic snapshots.
+
+Each session has a snapshot, its whole record (GameSession.to_record) as
+gzip-compressed JSON, and a journal of what happened since: players joining,
+accepted orders and turn boundaries, one JSON object per line. The simulation
+is deterministic, so replaying the journal over the snapshot rebuilds the
+session. A new snapshot is written every `snapshot_turns` turns and empties the
+journal, which bounds both the replay on startup and the journal's size, while
+a turn itself only costs a few small appends.
+
+Appends are written to the OS at once but forced to disk in batches: one
+thread fsyncs every journal written to in the last `sync_seconds`, so a crash
+of the machine (not just the process) loses at most that much. Records carry
+the turn they belong to, so records already covered by the snapshot (after a
+crash between writing a snapshot and emptying the journal) are skipped.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Iterator, List, Set, Tuple
+
+_SNAPSHOT_SUFFIX = '.snapshot.gz'
+_JOURNAL_SUFFIX = '.journal'
+
+
+def _write_durably(path: str, payload: bytes):
+    """Replaces the file at `path` with `payload`, so that it holds either the old or the new contents after a crash."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    directory = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+class SessionJournal:
+    """The snapshot and journal of one session. Written by the session's worker, synced by the Journal's thread."""
+    def __init__(self, journal: 'Journal', session_id: str):
+        self.journal = journal
+        self.session_id = session_id
+        self.snapshot_path = os.path.join(journal.directory, session_id + _SNAPSHOT_SUFFIX)
+        self.journal_path = os.path.join(journal.directory, session_id + _JOURNAL_SUFFIX)
+        self.lock = threading.Lock() # Between the writer and the sync thread
+        self.file = open(self.journal_path, 'ab')
+        self.turns_since_snapshot = 0
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self.lock:
+            if self.file is None:
+                return
+            self.file.write(line)
+            self.file.flush()
+        if record.get('type') == 'turn':
+            self.turns_since_snapshot += 1
+        self.journal.mark_dirty(self)
+
+    def needs_snapshot(self) -> bool:
+        return self.turns_since_snapshot >= self.journal.snapshot_turns
+
+    def write_snapshot(self, record: dict):
+        """Makes `record` the session's snapshot and empties the journal."""
+        _write_durably(self.snapshot_path, gzip.compress(json.dumps(record, separators=(',', ':')).encode('utf-8')))
+        with self.lock:
+            if self.file is not None:
+                self.file.truncate(0)
+                os.fsync(self.file.fileno())
+        self.turns_since_snapshot = 0
+
+    def sync(self):
+        with self.lock:
+            if self.file is not None:
+                os.fsync(self.file.fileno())
+
+    def delete(self):
+        """Closes the journal and removes the session's files, e.g. once it is saved elsewhere."""
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        for path in (self.journal_path, self.snapshot_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class Journal:
+    """The snapshots and journals of all sessions in a directory, and the thread that syncs them."""
+    def __init__(self, directory: str, snapshot_turns: int = 10, sync_seconds: float = 0.05):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_turns = max(1, snapshot_turns)
+        self.sync_seconds = sync_seconds
+        self.dirty: Set[SessionJournal] = set()
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="journal-sync", daemon=True)
+        self.thread.start()
+
+    def open(self, session_id: str) -> SessionJournal:
+        return SessionJournal(self, session_id)
+
+    def mark_dirty(self, session_journal: SessionJournal):
+        with self.condition:
+            if not self.dirty:
+                self.condition.notify()
+            self.dirty.add(session_journal)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.dirty:
+                    self.condition.wait()
+            # Let more appends gather, then force all of them to disk in one pass
+            time.sleep(self.sync_seconds)
+            with self.condition:
+                dirty, self.dirty = self.dirty, set()
+            for session_journal in dirty:
+                session_journal.sync()
+
+    def session_ids(self) -> List[str]:
+        """The sessions that have a snapshot here."""
+        return [name[:-len(_SNAPSHOT_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(_SNAPSHOT_SUFFIX)]
+
+    def load(self, session_id: str) -> Tuple[dict, Iterator[dict]]:
+        """
+        The snapshot of a session and the journal records to replay over it.
+        A torn last record, from a crash while it was being written, is ignored.
+        """
+        with open(os.path.join(self.directory, session_id + _SNAPSHOT_SUFFIX), 'rb') as f:
+            snapshot = json.loads(gzip.decompress(f.read()))
+        return snapshot, self._records(session_id, snapshot['state']['turn'])
+
+    def _records(self, session_id: str, snapshot_turn: int) -> Iterator[dict]:
+        try:
+            f = open(os.path.join(self.directory, session_id + _JOURNAL_SUFFIX), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get('turn', snapshot_turn) >= snapshot_turn:
+                    yield record
+
+    def delete(self, session_id: str):
+        for suffix in (_JOURNAL_SUFFIX, _SNAPSHOT_SUFFIX):
+            try:
+                os.remove(os.path.join(self.directory, session_id + suffix))
+            except FileNotFoundError:
+                pass
+
@@ -1,65 +1,329 @@
+import socket
 import socketserver
 import threading
-import json
+import logging
+import multiprocessing
+import os
+import queue
 import time
-from typing import Optional
-import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from nightfall.core.components.map import GameMap
 from nightfall.core.state.game_state import GameState
+from nightfall.core.state.delta import diff_states
+from nightfall.core.state.scenario import load_scenario, share_game_map
 from nightfall.core.engine.simulator import Simulator
+from nightfall.core.engine.instrumentation import TurnMetrics, latency_summary
+from nightfall.core.engine.turn_report import TurnReport
 from nightfall.core.actions.action import Action
+from nightfall.core.protocol.codec import FEATURE_MAP_REFS, PreparedMessage
+from nightfall.server import async_server, sharding
+from nightfall.server.journal import Journal, SessionJournal
+from nightfall.server.scheduler import Deadline, DeadlineScheduler
+from nightfall.server.session_store import SessionStore
+from nightfall.server.connection import FULL_STATE, STATE_PATCH, ClientConnection, new_session_id
 from nightfall.config import PROJECT_ROOT
 
 # --- Server Configuration ---
 HOST, PORT = "localhost", 9999
 INITIAL_STATE_FILE = PROJECT_ROOT / "nightfall/server/data/initial_state.json"
+# Number of worker processes used to resolve turns city by city. 0 resolves
+# turns serially on the session's worker thread.
+TURN_WORKERS = int(os.environ.get("NIGHTFALL_TURN_WORKERS", "0"))
+# Level of the console log sink. Per-action simulation logs are emitted at
+# DEBUG and are therefore off by default.
+LOG_LEVEL = os.environ.get("NIGHTFALL_LOG_LEVEL", "WARNING")
+# Network front end: "threaded" (a thread per connection), "asyncio" (a task
+# per connection, with commands run on COMMAND_THREADS threads) or "sharded"
+# (SHARDS asyncio server processes on local ports from SHARD_BASE_PORT, behind
+# a router on PORT). Shards already spread turns over processes, so in sharded
+# mode each one resolves turns serially and TURN_WORKERS is ignored.
+SERVER_MODE = os.environ.get("NIGHTFALL_SERVER_MODE", "threaded")
+COMMAND_THREADS = int(os.environ.get("NIGHTFALL_COMMAND_THREADS", "8"))
+SHARDS = int(os.environ.get("NIGHTFALL_SHARDS", str(os.cpu_count() or 1)))
+SHARD_BASE_PORT = int(os.environ.get("NIGHTFALL_SHARD_BASE_PORT", str(PORT + 1)))
+# Default seconds players get to send 'ready' before a turn is resolved with the
+# orders submitted so far. Sessions may set their own in 'create_session'; 0
+# waits for every connected player.
+TURN_SECONDS = float(os.environ.get("NIGHTFALL_TURN_SECONDS", "120"))
+# Seconds a session may go without players before it is saved to SESSION_STORE_DIR
+# and dropped from memory; joining it loads it back. 0 keeps sessions in memory.
+IDLE_SECONDS = float(os.environ.get("NIGHTFALL_IDLE_SECONDS", "300"))
+SESSION_STORE_DIR = os.environ.get("NIGHTFALL_SESSION_STORE", str(PROJECT_ROOT / "nightfall/server/data/sessions"))
+# Running sessions are journaled to JOURNAL_DIR (empty disables it) and recovered
+# from there on startup. A snapshot is taken every SNAPSHOT_TURNS turns, and
+# journal writes reach the disk within JOURNAL_SYNC_SECONDS.
+JOURNAL_DIR = os.environ.get("NIGHTFALL_JOURNAL_DIR", str(PROJECT_ROOT / "nightfall/server/data/journal"))
+SNAPSHOT_TURNS = int(os.environ.get("NIGHTFALL_SNAPSHOT_TURNS", "10"))
+JOURNAL_SYNC_SECONDS = float(os.environ.get("NIGHTFALL_JOURNAL_SYNC_SECONDS", "0.05"))
+
+logger = logging.getLogger(__name__)
 
 class GameSession:
-    """Manages the state and logic for a single game session."""
-    def __init__(self, session_id: str):
+    """
+    Manages the state and logic for a single game session.
+
+    Everything that reads or changes the session's game state runs on the
+    session's own worker thread, in the order it was submitted: connection
+    handlers only put commands in `mailbox` and go back to reading, and the
+    worker answers them through the handlers' outbound queues. A turn being
+    resolved therefore delays this session's commands, but never a read.
+
+    Once the session has had no players for `idle_seconds`, the worker calls
+    `on_idle(session)`; if that returns True (the session was hibernated, see
+    to_record and MasterServer.hibernate) the worker stops.
+
+    Once a journal is attached, players joining, accepted orders and turns
+    are recorded as they happen, so that the session can be rebuilt after a
+    crash (replay).
+    """
+    def __init__(self, session_id: str, turn_executor: Optional[Executor] = None,
+                 scheduler: Optional[DeadlineScheduler] = None, turn_seconds: float = 0,
+                 state: Optional[GameState] = None, idle_seconds: float = 0,
+                 on_idle: Optional[Callable[['GameSession'], bool]] = None):
         self.session_id = session_id
-        self.state = GameState.load_from_file(INITIAL_STATE_FILE)
-        self.simulator = Simulator()
-        self.lock = threading.Lock()
+        # The scenario is parsed once per process; sessions share its world map.
+        self.state = state if state is not None else load_scenario(INITIAL_STATE_FILE).new_state()
+        self.metrics = TurnMetrics()
+        self.simulator = Simulator(executor=turn_executor, hooks=self.metrics)
+        # Turn timer: once it runs out the turn is resolved even if not everyone is ready
+        self.scheduler = scheduler
+        self.turn_seconds = turn_seconds
+        self.deadline: Optional[Deadline] = None
+        # Idle timer: started when the last player leaves, stopped when one joins
+        self.idle_seconds = idle_seconds
+        self.on_idle = on_idle
+        self.idle_since: Optional[float] = None
+        self.idle_deadline: Optional[Deadline] = None
+        self.journal: Optional[SessionJournal] = None
+        # Metrics as of the last turn, replaced (never mutated) by the worker so other threads can read them
+        self._publish_stats()
+
+        # Clients hold the state at some version; after a turn, those holding the
+        # previous version get a patch against this snapshot instead of the full state.
+        self.state_version = 0
+        self.snapshot = self.state.to_dict(map_format='grids')
+        # (message type, codec name) -> full state message of the current version
+        self.prepared_states: Dict[Tuple[str, str], PreparedMessage] = {}
+
+        # Traffic counters, updated by the worker and by connection threads
+        self.stats_lock = threading.Lock()
+        self.messages_received = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
         
         # Player management for this session
         self.clients = {}  # player_id -> handler
         self.player_orders = {}
         self.player_ready_status = {}
-        print(f"GameSession '{session_id}' created.")
 
-    def handle_new_player(self, player_id, handler):
-        with self.lock:
-            # If player is rejoining, just update their handler. Otherwise, initialize them.
-            self.clients[player_id] = handler
-            if player_id not in self.player_ready_status:
-                self.player_ready_status[player_id] = False
-                self.player_orders[player_id] = []
-                print(f"Player '{player_id}' joined session '{self.session_id}' for the first time.")
-            else:
-                print(f"Player '{player_id}' reconnected to session '{self.session_id}'.")
+        # Commands for the worker thread, as (callable, args)
+        self.mailbox = queue.Queue()
+        self.running = True
+        self.worker = threading.Thread(target=self._run_worker, name=f"session-{session_id}", daemon=True)
+        self.worker.start()
 
-    def remove_player(self, player_id):
-        with self.lock:
-            # Only remove the active client handler, keep the player's data.
-            self.clients.pop(player_id, None)
-            print(f"Player '{player_id}' disconnected from session '{self.session_id}'. Their data is preserved.")
+    def to_record(self) -> dict:
+        """Everything needed to restore the session with from_record. Worker thread only."""
+        return {
+            'session_id': self.session_id,
+            'turn_seconds': self.turn_seconds,
+            'state_version': self.state_version,
+            'players': list(self.player_ready_status),
+            'player_orders': self.action_queues(),
+            'state': self.state.to_save_dict(),
+        }
 
-    def handle_set_orders(self, player_id, actions_data):
-        with self.lock:
-            # When new orders are set, the player is no longer ready.
-            action_class_map = GameState.ACTION_CLASS_MAP
-            self.player_orders[player_id] = [Action.from_dict(data, action_class_map) for data in actions_data]
+    @classmethod
+    def from_record(cls, record: dict, turn_executor: Optional[Executor] = None,
+                    scheduler: Optional[DeadlineScheduler] = None, idle_seconds: float = 0,
+                    on_idle: Optional[Callable[['GameSession'], bool]] = None) -> 'GameSession':
+        """Restores a session saved with to_record. Its players come back as not ready."""
+        state_data = record['state']
+        game_map = share_game_map(GameMap.from_dict(state_data['game_map']))
+        state = GameState.from_save_dict(state_data, game_map)
+        session = cls(record['session_id'], turn_executor, scheduler, record['turn_seconds'],
+                      state=state, idle_seconds=idle_seconds, on_idle=on_idle)
+        action_class_map = GameState.ACTION_CLASS_MAP
+        session.player_ready_status = dict.fromkeys(record['players'], False)
+        session.player_orders = {
+            player_id: [Action.from_dict(data, action_class_map) for data in actions]
+            for player_id, actions in record['player_orders'].items()
+        }
+        session.state_version = record['state_version']
+        return session
+
+    def attach_journal(self, journal: SessionJournal):
+        """Starts journaling from a snapshot of the current state. Call before the session is shared."""
+        self.journal = journal
+        journal.write_snapshot(self.to_record())
+
+    def replay(self, records: Iterable[dict]):
+        """Re-applies journal records on top of the state they were recorded from. Call before the session is shared."""
+        action_class_map = GameState.ACTION_CLASS_MAP
+        for record in records:
+            record_type = record['type']
+            if record_type == 'join':
+                self.player_ready_status.setdefault(record['player'], False)
+                self.player_orders.setdefault(record['player'], [])
+            elif record_type == 'orders':
+                self.player_orders[record['player']] = [Action.from_dict(data, action_class_map) for data in record['actions']]
+            elif record_type == 'turn':
+                self._simulate_turn()
+                self.state_version += 1
+        self.snapshot = self.state.to_dict(map_format='grids')
+        self._publish_stats()
+
+    def start_idle_timer(self):
+        """Starts the idle timer of a session nobody joined yet, e.g. one recovered after a restart."""
+        self.submit(self._start_idle_timer)
+
+    def submit(self, command: Callable, *args):
+        """Queues `command(*args)` to run on the session's worker thread."""
+        self.mailbox.put((command, args))
+
+    def _run_worker(self):
+        while self.running:
+            command, args = self.mailbox.get()
+            try:
+                command(*args)
+            except Exception:
+                logger.exception("Command %s failed in session '%s'.", command.__name__, self.session_id)
+
+    def _respond(self, handler, command: Callable, *args):
+        """
+        Runs a command for `handler`'s client and sends it the response dict the
+        command returns, if any. A command that fails is answered with an error,
+        so the client is never left waiting for a reply.
+        """
+        try:
+            response = command(*args)
+        except Exception:
+            logger.exception("Command %s failed in session '%s'.", command.__name__, self.session_id)
+            response = {"status": "error", "message": "The server could not process the command."}
+        if response is not None:
+            handler.send_response(response)
+
+    def record_message_received(self):
+        with self.stats_lock:
+            self.messages_received += 1
+
+    def record_message_sent(self, num_bytes: int):
+        with self.stats_lock:
+            self.messages_sent += 1
+            self.bytes_sent += num_bytes
+
+    def _publish_stats(self):
+        stats = self.metrics.to_dict()
+        stats['turn'] = self.state.turn
+        stats['turn_seconds'] = self.turn_seconds
+        self.published_turn_seconds = tuple(self.metrics.turn_seconds)
+        self.published_stats = stats
+
+    def get_stats(self) -> dict:
+        """Simulation metrics as of the last turn and traffic counters for this session."""
+        stats = dict(self.published_stats)
+        stats['players'] = len(self.clients)
+        with self.stats_lock:
+            stats['messages_received'] = self.messages_received
+            stats['messages_sent'] = self.messages_sent
+            stats['bytes_sent'] = self.bytes_sent
+        return stats
+
+    # The methods below are called by connection handlers; each queues the work for the worker.
+
+    def handle_new_player(self, player_id, handler, ack_message: str):
+        """Adds (or reconnects) a player, then sends them the state followed by `ack_message`."""
+        self.submit(self._respond, handler, self._add_player, player_id, handler, ack_message)
+
+    def remove_player(self, player_id, handler):
+        self.submit(self._remove_player, player_id, handler)
+
+    def handle_set_orders(self, player_id, actions_data, handler):
+        # Malformed orders are refused right away and never reach the worker
+        try:
+            actions = [Action.from_dict(data, GameState.ACTION_CLASS_MAP) for data in actions_data]
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            handler.send_response({"status": "error", "message": f"Invalid orders: {e}"})
+            return
+        self.submit(self._respond, handler, self._set_orders, player_id, actions)
+
+    def handle_ready(self, player_id, handler):
+        self.submit(self._respond, handler, self._set_ready, player_id)
+
+    def send_full_state(self, handler, message_type: str = "state_update"):
+        """Sends a client the whole state, e.g. when it asks for a resync."""
+        self.submit(self._respond, handler, self._send_full_state, handler, message_type)
+
+    # Worker thread only from here on.
+
+    def _add_player(self, player_id, handler, ack_message: str):
+        # If player is rejoining, just update their handler. Otherwise, initialize them.
+        self.clients[player_id] = handler
+        if player_id not in self.player_ready_status:
             self.player_ready_status[player_id] = False
-            print(f"Received orders from player '{player_id}' in session '{self.session_id}'.")
-            return {"status": "success", "message": "Orders received."}
+            self.player_orders[player_id] = []
+            self._journal({'type': 'join', 'turn': self.state.turn, 'player': player_id})
+            print(f"Player '{player_id}' joined session '{self.session_id}' for the first time.")
+        else:
+            print(f"Player '{player_id}' reconnected to session '{self.session_id}'.")
+        # On join/rejoin, send the state including any persisted orders for that player
+        self._send_full_state(handler, "initial_state")
+        handler.send_message({"type": "ack", "payload": {"message": ack_message}})
+        self._start_deadline()
+        self.idle_since = None
+        if self.idle_deadline is not None:
+            self.scheduler.cancel(self.idle_deadline)
+            self.idle_deadline = None
 
-    def handle_ready(self, player_id):
-        with self.lock:
-            if player_id in self.player_ready_status:
-                self.player_ready_status[player_id] = True
-                print(f"Player '{player_id}' is ready in session '{self.session_id}'.")
-                self.check_for_turn_simulation()
-            return {"status": "success", "message": "Ready status updated."}
+    def _remove_player(self, player_id, handler):
+        # Only remove the active client handler, keep the player's data.
+        # A player who already reconnected on another connection stays.
+        if self.clients.get(player_id) is handler:
+            del self.clients[player_id]
+            print(f"Player '{player_id}' disconnected from session '{self.session_id}'. Their data is preserved.")
+            if not self.clients:
+                self._start_idle_timer()
+
+    def _start_idle_timer(self):
+        if not self.idle_seconds or not self.scheduler or not self.on_idle:
+            return
+        since = self.idle_since = time.monotonic()
+        self.idle_deadline = self.scheduler.schedule(since + self.idle_seconds, lambda: self.submit(self._on_idle, since))
+
+    def _on_idle(self, since: float):
+        if since != self.idle_since:
+            return # A player joined since this timer was started
+        self.idle_deadline = None
+        if self.on_idle(self):
+            self.running = False
+            if self.deadline is not None:
+                self.scheduler.cancel(self.deadline)
+                self.deadline = None
+
+    def _set_orders(self, player_id, actions):
+        # When new orders are set, the player is no longer ready.
+        # Orders run at the start of the next turn, after action points are refilled.
+        # Actions that would fail are dropped now rather than discovered during the turn.
+        validation = self.simulator.validate_queue(self.state, actions, refill_action_points=True)
+        self.player_orders[player_id] = [action for action, result in zip(actions, validation.results) if result]
+        self.player_ready_status[player_id] = False
+        self._journal({'type': 'orders', 'turn': self.state.turn, 'player': player_id,
+                       'actions': [action.to_dict() for action in self.player_orders[player_id]]})
+        print(f"Received orders from player '{player_id}' in session '{self.session_id}'.")
+
+        rejected = validation.failed_indices
+        if rejected:
+            reasons = ", ".join(f"#{i + 1}: {validation.results[i].failure.name}" for i in rejected)
+            return {"status": "success", "message": f"Orders received. Rejected {len(rejected)} invalid action(s) ({reasons})."}
+        return {"status": "success", "message": "Orders received."}
+
+    def _set_ready(self, player_id):
+        if player_id in self.player_ready_status:
+            self.player_ready_status[player_id] = True
+            print(f"Player '{player_id}' is ready in session '{self.session_id}'.")
+            self.check_for_turn_simulation()
+        return {"status": "success", "message": "Ready status updated."}
 
     def check_for_turn_simulation(self):
         if not self.player_ready_status or not self.clients:
@@ -70,165 +334,426 @@ class GameSession:
 
         if all_ready:
             print(f"\n--- All players ready in session '{self.session_id}'! Simulating turn. ---")
-            for player_id, orders in self.player_orders.items():
-                if player_id in self.state.players:
-                    self.state.players[player_id].action_queue = orders
-
-            self.simulator.simulate_full_turn(self.state)
-            
-            for pid in self.player_ready_status:
-                if pid in self.clients: # Only un-ready active players
-                    self.player_ready_status[pid] = False
-            self.player_orders.clear()
-            
-            # In a real game, each session would have its own save file
-            # self.state.save_to_file(f"data/{self.session_id}.json")
-            
-            print(f"--- Turn {self.state.turn} simulated. Broadcasting new state to session clients. ---\n")
-            self.broadcast_state()
+            self.resolve_turn()
+
+    def _start_deadline(self):
+        """Starts the timer of the current turn, unless it is running, turns have no time limit or nobody is playing."""
+        if self.deadline is not None or not self.turn_seconds or not self.scheduler or not self.clients:
+            return
+        turn = self.state.turn
+        self.deadline = self.scheduler.schedule(time.monotonic() + self.turn_seconds, lambda: self.submit(self._on_deadline, turn))
+
+    def _on_deadline(self, turn: int):
+        if turn != self.state.turn:
+            return # The turn was resolved before its deadline came up
+        self.deadline = None
+        if not self.clients:
+            return # Nobody to play for; the timer starts again when a player joins
+        print(f"\n--- Turn deadline passed in session '{self.session_id}'. Simulating turn with the orders submitted so far. ---")
+        self.resolve_turn()
+
+    def resolve_turn(self):
+        if self.deadline is not None:
+            self.scheduler.cancel(self.deadline)
+            self.deadline = None
+        # Written ahead: a crash while simulating replays the whole turn
+        self._journal({'type': 'turn', 'turn': self.state.turn})
+        report = self._simulate_turn()
+
+        print(f"--- Turn {self.state.turn} simulated. Broadcasting new state to session clients. ---\n")
+        self._publish_stats()
+        self.broadcast_state()
+        self.send_turn_reports(report)
+        # After the broadcast, so that writing it does not delay the new state
+        if self.journal is not None and self.journal.needs_snapshot():
+            self.journal.write_snapshot(self.to_record())
+        self._start_deadline()
+
+    def _simulate_turn(self) -> TurnReport:
+        for player_id, orders in self.player_orders.items():
+            if player_id in self.state.players:
+                self.state.players[player_id].action_queue = orders
+
+        report = self.simulator.simulate_full_turn(self.state)
+
+        for pid in self.player_ready_status:
+            if pid in self.clients: # Only un-ready active players
+                self.player_ready_status[pid] = False
+        self.player_orders.clear()
+        return report
+
+    def _journal(self, record: dict):
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def action_queues(self) -> dict:
+        """The orders players have queued for the next turn, sent next to every state and patch."""
+        return {pid: [o.to_dict() for o in orders] for pid, orders in self.player_orders.items()}
+
+    def _prepared_state(self, message_type: str, codec, map_refs: bool) -> PreparedMessage:
+        """
+        The full state message for the current version, encoded once per codec
+        and reused for every recipient until the next turn. Only the action
+        queues are encoded per send. With `map_refs` the world map is replaced
+        by a reference to its content hash.
+        """
+        key = (message_type, codec.name, map_refs)
+        prepared = self.prepared_states.get(key)
+        if prepared is None:
+            # The snapshot already is the state in the 'grids' format
+            if codec.map_format == 'grids':
+                payload = dict(self.snapshot)
+            else:
+                payload = self.state.to_dict(include_map=not map_refs, map_format=codec.map_format)
+            if map_refs:
+                payload['game_map'] = self.state.game_map.to_dict(map_format='ref')
+            payload['version'] = self.state_version
+            prepared = self.prepared_states[key] = codec.prepare({"type": message_type, "payload": payload}, "action_queues")
+        return prepared
+
+    def _send_full_state(self, handler, message_type: str):
+        prepared = self._prepared_state(message_type, handler.codec, FEATURE_MAP_REFS in handler.features)
+        handler.send_frame(prepared.frame(self.action_queues()), FULL_STATE)
+        handler.state_version = self.state_version
+
+    def map_message(self, content_hash: str, map_format: str) -> Optional[dict]:
+        """The world map for a client that asked for it by hash, or None if this session uses another map."""
+        game_map = self.state.game_map
+        if game_map.content_hash() != content_hash:
+            return None
+        return {"type": "map", "payload": {"hash": content_hash, "game_map": game_map.to_dict(map_format=map_format)}}
 
     def broadcast_state(self):
-        state_json_str = self.state.to_json_string()
-        payload = json.loads(state_json_str)
-        # Ensure player action queues are included in the broadcast
-        for pid, orders in self.player_orders.items():
-            if pid in payload['players']:
-                payload['players'][pid]['action_queue'] = [o.to_dict() for o in orders]
-        message = json.dumps({"type": "state_update", "payload": payload})
+        base_version, base_snapshot = self.state_version, self.snapshot
+        self.state_version += 1
+        self.snapshot = self.state.to_dict(map_format='grids')
+        self.prepared_states.clear()
+        action_queues = self.action_queues()
+
+        # Every message is encoded once per codec and sent as the same bytes to all its recipients.
+        # Sending only queues the frames, so a slow client never holds up the others or the lock.
+        patches = {}
+        frames = {}
         for handler in list(self.clients.values()):
-            try:
-                handler.send_message(message)
-            except OSError as e:
-                print(f"Error broadcasting to a client: {e}")
+            codec = handler.codec
+            # A client that has not even received the previous state yet gets the latest one in its place
+            is_patch = handler.state_version == base_version and not handler.outbox.has_pending_state()
+            map_refs = FEATURE_MAP_REFS in handler.features
+            key = (is_patch, codec.name, map_refs)
+            if key not in frames:
+                if is_patch:
+                    if codec.map_format not in patches:
+                        patch = diff_states(base_snapshot, self.snapshot, codec.map_format)
+                        patch.update(base_version=base_version, version=self.state_version)
+                        patches[codec.map_format] = patch
+                    prepared = codec.prepare({"type": "state_patch", "payload": patches[codec.map_format]}, "action_queues")
+                else:
+                    prepared = self._prepared_state("state_update", codec, map_refs)
+                frames[key] = prepared.frame(action_queues)
+            handler.state_version = self.state_version
+            handler.send_frame(frames[key], STATE_PATCH if is_patch else FULL_STATE)
+
+    def send_turn_reports(self, report: TurnReport):
+        """Sends each connected player the outcome of the actions they queued."""
+        for pid, handler in list(self.clients.items()):
+            handler.send_message({"type": "turn_report", "payload": report.for_player(pid).to_dict()})
 
 class MasterServer:
-    """Manages all active game sessions and new connections."""
+    """
+    Manages all active game sessions and new connections.
+
+    Sessions left without players are hibernated into `store` after
+    IDLE_SECONDS, so memory grows with the sessions in play rather than with
+    all sessions ever created; joining a hibernated session restores it.
+    Sessions in memory are kept in `journal`, to be recovered after a restart.
+    """
     def __init__(self):
         self.sessions = {} # session_id -> GameSession
         self.lock = threading.Lock()
+        # Sessions being created, restored or hibernated, set once they are in
+        # `sessions` or the store. The disk work happens outside the lock.
+        self.in_transit: Dict[str, threading.Event] = {}
+        self.turn_executor: Optional[Executor] = None # Shared by all sessions; set up in main()
+        self.scheduler = DeadlineScheduler() # Turn and idle deadlines of all sessions
+        self.store: Optional[SessionStore] = None # Hibernated sessions; set up in main()
+        self.journal: Optional[Journal] = None # Journals of the sessions in memory; set up in main()
+
+    def _session_options(self) -> dict:
+        if self.store is None:
+            return {}
+        return {'idle_seconds': IDLE_SECONDS, 'on_idle': self.hibernate}
 
-    def create_session(self, player_id, handler) -> GameSession:
+    def _publish(self, session_id: str, claim: threading.Event, session: Optional[GameSession],
+                 player_id=None, handler=None, ack_message: str = ''):
+        """Ends a claim on `session_id`, adding `session` (if any) and then the player (if any) under the lock."""
         with self.lock:
-            session_id = str(uuid.uuid4())[:8] # Create a unique session ID
-            session = GameSession(session_id)
-            self.sessions[session_id] = session
-            return session
+            del self.in_transit[session_id]
+            if session is not None:
+                self.sessions[session_id] = session
+                if handler is not None:
+                    # Queued under the lock, so the session cannot hibernate before the player is in
+                    session.handle_new_player(player_id, handler, ack_message)
+        claim.set()
+
+    def create_session(self, player_id, handler, session_id: Optional[str] = None,
+                       turn_seconds: Optional[float] = None) -> Optional[GameSession]:
+        """
+        Creates a session, with the given ID if any (None if it is taken) or a
+        new unique one, and `turn_seconds` per turn (TURN_SECONDS if None).
+        """
+        if session_id is None:
+            session_id = new_session_id()
+        with self.lock:
+            if session_id in self.sessions or session_id in self.in_transit:
+                return None
+            claim = self.in_transit[session_id] = threading.Event()
+        session = None
+        try:
+            # While the ID is claimed nobody can hibernate a session under it, so the store is checked after claiming
+            if self.store is not None and session_id in self.store:
+                return None
+            turn_seconds = TURN_SECONDS if turn_seconds is None else turn_seconds
+            session = GameSession(session_id, self.turn_executor, self.scheduler, turn_seconds,
+                                  **self._session_options())
+            if self.journal is not None:
+                session.attach_journal(self.journal.open(session_id))
+            print(f"GameSession '{session_id}' created.")
+        finally:
+            self._publish(session_id, claim, session)
+        return session
     
     def list_sessions(self):
+        # Return a list of session IDs and their player counts; hibernated sessions have none
+        sessions = dict.fromkeys(self.store.session_ids(), 0) if self.store is not None else {}
         with self.lock:
-            # Return a list of session IDs and their player counts
-            return {sid: len(s.clients) for sid, s in self.sessions.items()}
+            sessions.update((sid, len(s.clients)) for sid, s in self.sessions.items())
+            return sessions
+
+    def join_session(self, session_id, player_id, handler, ack_message: str) -> Optional[GameSession]:
+        """Adds a player to a session, restoring it first if it is hibernated. None if there is no such session."""
+        while True:
+            with self.lock:
+                session = self.sessions.get(session_id)
+                if session is not None:
+                    # Queued under the lock, so the session cannot hibernate before the player is in
+                    session.handle_new_player(player_id, handler, ack_message)
+                    return session
+                claim = self.in_transit.get(session_id)
+                if claim is None:
+                    if self.store is None or session_id not in self.store:
+                        return None
+                    claim = self.in_transit[session_id] = threading.Event()
+                    break
+            # Someone else is creating, restoring or hibernating it; look again once they are done.
+            # Only joins of this one session wait, and only for its disk I/O.
+            claim.wait()
+
+        session = None
+        try:
+            session = self._restore(session_id)
+        except Exception:
+            logger.exception("Could not restore session '%s'.", session_id)
+        finally:
+            self._publish(session_id, claim, session, player_id, handler, ack_message)
+        return session
+
+    def _restore(self, session_id: str) -> Optional[GameSession]:
+        record = self.store.load(session_id)
+        if record is None:
+            return None
+        session = GameSession.from_record(record, self.turn_executor, self.scheduler, **self._session_options())
+        if self.journal is not None:
+            session.attach_journal(self.journal.open(session_id))
+        # Only now that the journal has the session
+        self.store.delete(session_id)
+        print(f"GameSession '{session_id}' restored from hibernation.")
+        return session
+
+    def hibernate(self, session: GameSession) -> bool:
+        """
+        Saves an idle session to the store and forgets it. Called on the
+        session's worker; returns False, leaving the session running, if a
+        player joined or is joining it meanwhile, or if it could not be saved.
+        """
+        session_id = session.session_id
+        with self.lock:
+            if session.clients or not session.mailbox.empty():
+                return False
+            # Joins wait for the claim from here on, so nothing reaches the mailbox while the session is saved
+            del self.sessions[session_id]
+            claim = self.in_transit[session_id] = threading.Event()
+        try:
+            self.store.save(session_id, session.to_record())
+        except OSError:
+            logger.exception("Could not hibernate session '%s'; it stays in memory.", session_id)
+            self._publish(session_id, claim, session)
+            return False
+        if session.journal is not None:
+            session.journal.delete()
+            session.journal = None
+        self._publish(session_id, claim, None)
+        print(f"GameSession '{session_id}' hibernated.")
+        return True
+
+    def recover_sessions(self, owns: Callable[[str], bool] = lambda session_id: True) -> int:
+        """
+        Rebuilds the sessions found in the journal (those for which `owns` is
+        true) from their last snapshot and journal. Called on startup, before
+        serving clients; returns the number of sessions recovered.
+        """
+        recovered = 0
+        for session_id in self.journal.session_ids():
+            if not owns(session_id):
+                continue
+            if self.store is not None and session_id in self.store:
+                # Hibernated just before the crash; the store has its latest state
+                self.journal.delete(session_id)
+                continue
+            try:
+                snapshot, records = self.journal.load(session_id)
+                session = GameSession.from_record(snapshot, self.turn_executor, self.scheduler, **self._session_options())
+                session.replay(records)
+            except Exception:
+                logger.exception("Could not recover session '%s'; its journal is left in place.", session_id)
+                continue
+            session.attach_journal(self.journal.open(session_id))
+            self.sessions[session_id] = session
+            session.start_idle_timer()
+            recovered += 1
+        return recovered
 
-    def join_session(self, session_id, player_id, handler) -> Optional[GameSession]:
+    def get_stats(self) -> dict:
+        """Per-session stats plus turn latency percentiles across all sessions."""
         with self.lock:
-            return self.sessions.get(session_id)
+            sessions = dict(self.sessions)
+        session_stats = {}
+        turn_samples = []
+        for sid, session in sessions.items():
+            session_stats[sid] = session.get_stats()
+            turn_samples.extend(session.published_turn_seconds)
+        return {
+            'sessions': session_stats,
+            'hibernated': len(self.store) if self.store is not None else 0,
+            'scheduler': self.scheduler.get_stats(),
+            'turn_latency': latency_summary(turn_samples),
+        }
     
 master_server = MasterServer()
 
+class SocketConnection(ClientConnection):
+    """A client served by a blocking socket, read on its own thread and written by another."""
+    def __init__(self, master, client_address, sock):
+        super().__init__(master, client_address)
+        self.sock = sock
+        self.writer_thread = threading.Thread(target=self._drain_outbox, daemon=True)
+        self.writer_thread.start()
+
+    def _drain_outbox(self):
+        while True:
+            frames = self.outbox.take()
+            if frames is None:
+                return
+            try:
+                self.sock.sendall(b''.join(frames))
+            except OSError:
+                self.close()
+                return
+
+    def notify_writer(self):
+        pass # The writer thread blocks on the outbox itself
+
+    def close(self):
+        self.outbox.close()
+        try:
+            # Wakes the reading thread, which then cleans up the connection
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
 class ThreadedTCPRequestHandler(socketserver.BaseRequestHandler):
     def setup(self):
-        self.player_id = None
-        self.session = None
+        self.connection = SocketConnection(master_server, self.client_address, self.request)
 
     def handle(self):
+        connection = self.connection
         print(f"Connection from {self.client_address}")
         try:
-            f = self.request.makefile('r')
+            f = self.request.makefile('rb')
             while True:
-                line = f.readline()
-                if not line: break
+                data = connection.codec.read_message(f)
+                if data is None: break
                 
-                data = json.loads(line)
-                self.process_command(data)
+                connection.process_command(data)
         except (ConnectionResetError, BrokenPipeError):
-            print(f"Client {self.client_address} ({self.player_id}) disconnected abruptly.")
+            print(f"Client {self.client_address} ({connection.player_id}) disconnected abruptly.")
         finally:
-            self.cleanup_connection()
-
-    def cleanup_connection(self):
-        print(f"Client {self.client_address} ({self.player_id}) disconnected.")
-        if self.session and self.player_id:
-            self.session.remove_player(self.player_id)
+            connection.cleanup_connection()
 
-    def process_command(self, data):
-        command = data.get("command")
-        
-        if not self.session: # Initial commands before being in a session
-            if command == "list_sessions":
-                sessions_info = master_server.list_sessions()
-                response = {"type": "session_list", "payload": sessions_info}
-                self.send_message(json.dumps(response))
-                return
+class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    allow_reuse_address = True
 
-            elif command == "create_session":
-                self.player_id = data.get("player_id", "player1")
-                self.session = master_server.create_session(self.player_id, self)
-                self.session.handle_new_player(self.player_id, self)
-                
-                # The client expects an 'initial_state' message type
-                payload = self.session.state.to_dict()
-                # On creation, the action queue is empty
-                for p_data in payload['players'].values():
-                    p_data['action_queue'] = []
-
-                response = {"type": "initial_state", "payload": payload}
-                self.send_message(json.dumps(response))
-                # Also send an ack for session creation
-                ack_msg = {"type": "ack", "payload": {"message": f"Created and joined session {self.session.session_id}"}}
-                self.send_message(json.dumps(ack_msg))
-
-            elif command == "join_session":
-                payload = data.get("payload", {})
-                session_id = payload.get("session_id")
-                self.player_id = payload.get("player_id", f"player{int(time.time()) % 1000}")
-                session = master_server.join_session(session_id, self.player_id, self)
-                if session:
-                    self.session = session
-                    self.session.handle_new_player(self.player_id, self)
-                    # On join/rejoin, send the state including any persisted orders for that player
-                    payload = self.session.state.to_dict()
-                    for pid, orders in self.session.player_orders.items():
-                        if pid in payload['players']:
-                            payload['players'][pid]['action_queue'] = [o.to_dict() for o in orders]
-
-                    response = {"type": "initial_state", "payload": payload}
-                    self.send_message(json.dumps(response))
-                    ack_msg = {"type": "ack", "payload": {"message": f"Joined session {session_id}"}}
-                    self.send_message(json.dumps(ack_msg))
-                else:
-                    err_msg = {"type": "error", "payload": {"message": f"Session '{session_id}' not found."}}
-                    self.send_message(json.dumps(err_msg))
-        else: # In-game commands, delegate to the session
-            player_id = data.get("player_id")
-            payload = data.get("payload")
-            response_data = {}
-
-            if command == "set_orders":
-                response_data = self.session.handle_set_orders(player_id, payload)
-            elif command == "ready":
-                response_data = self.session.handle_ready(player_id)
-            elif command == "leave_session":
-                self.session.remove_player(player_id)
-                self.session = None # Detach handler from session
-                response_data = {"status": "success", "message": "Exited to lobby."}
-                # No need to send ack, client handles state change locally
-                return
-            elif command == "join_session": # Player is already in a session, cannot join another
-                response_data = {"status": "error", "message": "Already in a session."}
-            else:
-                response_data = {"status": "error", "message": "Unknown command"}
-            
-            # Format the response to what the client expects (ack/error)
-            response_type = "ack" if response_data.get("status") == "success" else "error"
-            self.send_message(json.dumps({"type": response_type, "payload": {"message": response_data.get("message")}}))
+def open_stores(owns: Callable[[str], bool] = lambda session_id: True):
+    """Sets up the session store and journal, and recovers the journaled sessions `owns` accepts."""
+    master_server.store = SessionStore(SESSION_STORE_DIR, owns)
+    if JOURNAL_DIR:
+        master_server.journal = Journal(JOURNAL_DIR, SNAPSHOT_TURNS, JOURNAL_SYNC_SECONDS)
+        started = time.perf_counter()
+        recovered = master_server.recover_sessions(owns)
+        if recovered:
+            print(f"Recovered {recovered} session(s) from the journal in {time.perf_counter() - started:.2f}s.")
 
-    def send_message(self, message: str):
-        self.request.sendall(message.encode('utf-8') + b'\n')
+def run_shard(port: int, shard_index: int, shard_count: int):
+    """Entry point of a shard process in the sharded mode: serves its sessions on a local port."""
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # Shards share the store and journal; each one only lists and recovers the sessions the router sends to it
+    ring = sharding.HashRing(list(range(shard_count)))
+    open_stores(lambda session_id: ring.node_for(session_id) == shard_index)
+    try:
+        async_server.run(master_server, "127.0.0.1", port, COMMAND_THREADS)
+    except KeyboardInterrupt:
+        pass
 
-class ThreadedTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
-    allow_reuse_address = True
+def run_sharded():
+    shards = [("127.0.0.1", SHARD_BASE_PORT + i) for i in range(SHARDS)]
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_shard, args=(port, index, SHARDS), daemon=True)
+        for index, (_, port) in enumerate(shards)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Master Server (router for {SHARDS} shards) starting up on {HOST}:{PORT}")
+    try:
+        sharding.run_router(HOST, PORT, shards)
+        print("Shutting down server.")
+    finally:
+        for process in processes:
+            process.terminate()
 
 def main():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    if SERVER_MODE == "sharded":
+        if TURN_WORKERS > 0:
+            print("NIGHTFALL_TURN_WORKERS is ignored in sharded mode; each shard resolves turns serially.")
+        run_sharded()
+        return
+
+    if TURN_WORKERS > 0:
+        master_server.turn_executor = ProcessPoolExecutor(max_workers=TURN_WORKERS)
+        print(f"Resolving turns on {TURN_WORKERS} worker processes.")
+    open_stores()
+
+    if SERVER_MODE == "asyncio":
+        print(f"Master Server (asyncio) starting up on {HOST}:{PORT}")
+        try:
+            async_server.run(master_server, HOST, PORT, COMMAND_THREADS)
+        except KeyboardInterrupt:
+            print("Shutting down server.")
+        finally:
+            if master_server.turn_executor:
+                master_server.turn_executor.shutdown()
+        return
+
     server = ThreadedTCPServer((HOST, PORT), ThreadedTCPRequestHandler)
     print(f"Master Server starting up on {HOST}:{PORT}")
     with server:
@@ -241,6 +766,8 @@ def main():
         except KeyboardInterrupt:
             print("Shutting down server.")
             server.shutdown()
+            if master_server.turn_executor:
+                master_server.turn_executor.shutdown()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
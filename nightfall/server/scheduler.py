@@ -0,0 +1,82 @@
+"""
+Deadline scheduler for turn timers.
+
+One thread keeps all pending deadlines in a heap and sleeps until the earliest
+one, so tracking tens of thousands of sessions costs a heap entry each rather
+than a timer thread each. Cancelled deadlines stay in the heap and are skipped
+when they come up. Callbacks run on the scheduler thread and must be quick;
+sessions only hand the work to their own worker.
+
+The scheduler records its lag, the delay between a deadline and the moment its
+callback actually ran, which grows when the process is overloaded.
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List
+from nightfall.core.engine.instrumentation import percentile
+
+
+class Deadline:
+    """A scheduled callback. Returned by DeadlineScheduler.schedule to cancel it."""
+    __slots__ = ('when', 'callback', 'cancelled')
+
+    def __init__(self, when: float, callback: Callable[[], None]):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+
+class DeadlineScheduler:
+    """Runs callbacks at monotonic-clock deadlines, on a single thread."""
+    def __init__(self, max_lag_samples: int = 1000):
+        self.heap: List[tuple] = [] # (when, sequence, Deadline)
+        self.sequence = itertools.count() # Orders deadlines due at the same time
+        self.condition = threading.Condition()
+        self.fired = 0
+        self.lag_seconds: Deque[float] = deque(maxlen=max_lag_samples)
+        self.thread = threading.Thread(target=self._run, name="deadlines", daemon=True)
+        self.thread.start()
+
+    def schedule(self, when: float, callback: Callable[[], None]) -> Deadline:
+        """Runs `callback` once time.monotonic() reaches `when`."""
+        deadline = Deadline(when, callback)
+        with self.condition:
+            heapq.heappush(self.heap, (when, next(self.sequence), deadline))
+            # Only a new earliest deadline changes how long the thread has to sleep
+            if self.heap[0][2] is deadline:
+                self.condition.notify()
+        return deadline
+
+    def cancel(self, deadline: Deadline):
+        deadline.cancelled = True
+        # Drop the callback so that a cancelled deadline does not keep its session in memory
+        deadline.callback = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.heap or self.heap[0][0] > time.monotonic():
+                    self.condition.wait(self.heap[0][0] - time.monotonic() if self.heap else None)
+                _, _, deadline = heapq.heappop(self.heap)
+                callback = deadline.callback
+                if deadline.cancelled or callback is None:
+                    continue
+                self.fired += 1
+                self.lag_seconds.append(time.monotonic() - deadline.when)
+            callback()
+            # Do not hold on to the callback (and whatever it refers to) while waiting for the next one
+            deadline = callback = None
+
+    def get_stats(self) -> dict:
+        with self.condition:
+            lag = list(self.lag_seconds)
+            return {
+                'pending': sum(1 for _, _, deadline in self.heap if not deadline.cancelled),
+                'fired': self.fired,
+                'lag_p50_s': percentile(lag, 50),
+                'lag_p99_s': percentile(lag, 99),
+                'lag_max_s': max(lag, default=0.0),
+            }
@@ -0,0 +1,72 @@
+"""
+On-disk store of hibernated sessions.
+
+A session whose players have all been gone for a while is written here and
+dropped from memory; joining it later loads it back. Each session is one
+gzip-compressed JSON record (see GameSession.to_record) in the store's
+directory. The directory is the only index: in sharded mode all shards share
+it, so every listing rescans it, keeping only the sessions this server owns.
+"""
+import gzip
+import json
+import os
+from typing import Callable, List, Optional
+from nightfall.server.connection import is_valid_session_id
+
+SESSION_FORMAT = 'nightfall-session'
+SESSION_VERSION = 1
+_SUFFIX = '.session.gz'
+
+
+class SessionStore:
+    def __init__(self, directory: str, owns: Callable[[str], bool] = lambda session_id: True):
+        self.directory = directory
+        self.owns = owns # Whether a stored session belongs to this server
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.directory, session_id + _SUFFIX)
+
+    def session_ids(self) -> List[str]:
+        """The stored sessions this server owns."""
+        session_ids = (name[:-len(_SUFFIX)] for name in os.listdir(self.directory) if name.endswith(_SUFFIX))
+        return [session_id for session_id in session_ids if self.owns(session_id)]
+
+    def __contains__(self, session_id) -> bool:
+        # Only plain IDs map to a file in the directory
+        return is_valid_session_id(session_id) and self.owns(session_id) and os.path.exists(self._path(session_id))
+
+    def __len__(self) -> int:
+        return len(self.session_ids())
+
+    def save(self, session_id: str, record: dict):
+        data = {'format': SESSION_FORMAT, 'version': SESSION_VERSION}
+        data.update(record)
+        payload = gzip.compress(json.dumps(data, separators=(',', ':')).encode('utf-8'))
+        # Write to a temporary file first so a crash never leaves a truncated session behind,
+        # and sync it: the session's journal is deleted once it is saved here
+        temp_path = self._path(session_id) + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path(session_id))
+
+    def load(self, session_id: str) -> Optional[dict]:
+        """The record of a stored session, or None if there is none."""
+        if session_id not in self:
+            return None
+        try:
+            with open(self._path(session_id), 'rb') as f:
+                data = json.loads(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            return None # Restored by another server meanwhile
+        if data.get('format') != SESSION_FORMAT or data.get('version', 0) > SESSION_VERSION:
+            raise ValueError(f"Session '{session_id}' was stored in an unsupported format.")
+        return data
+
+    def delete(self, session_id: str):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,223 @@
+"""
+Sharded mode: sessions spread over several server processes behind a router.
+
+Each shard is an ordinary game server (the asyncio front end) listening on a
+local port and owning the sessions placed on it. The router accepts the
+clients and handles the lobby itself: codec negotiation, `list_sessions` from
+a registry merged from all shards, and `stats` fanned out to them. A session
+is placed on the shard chosen by a consistent hash of its ID (`HashRing`), so
+both create and join find the owner without asking anyone, and changing the
+number of shards only moves about 1/N of the sessions.
+
+Once a client creates or joins a session, the router connects it to the
+owning shard (repeating the client's hello there) and relays frames in both
+directions without re-encoding them, until the client leaves the session and
+returns to the router's lobby.
+"""
+import asyncio
+import bisect
+import hashlib
+import signal
+from typing import Dict, List, Optional, Tuple
+from nightfall.core.protocol.codec import FEATURES, HELLO_COMMAND, JSON_CODEC, negotiate
+from nightfall.server.async_server import LISTEN_BACKLOG, MAX_MESSAGE_BYTES
+from nightfall.server.connection import new_session_id
+
+# Largest frame relayed from a shard to a client
+MAX_SHARD_FRAME_BYTES = 64 << 20
+# Seconds between refreshes of the session registry
+REGISTRY_POLL_INTERVAL = 1.0
+# Points per shard on the hash ring; more points spread sessions more evenly
+RING_REPLICAS = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys (session IDs) onto nodes (shard indices)."""
+    def __init__(self, nodes: List[int], replicas: int = RING_REPLICAS):
+        points = sorted((_hash(f"{node}#{replica}"), node) for node in nodes for replica in range(replicas))
+        self.hashes = [h for h, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+class ShardRouter:
+    """Accepts clients, serves the lobby and relays session traffic to the owning shards."""
+    def __init__(self, shards: List[Tuple[str, int]]):
+        self.shards = shards
+        self.ring = HashRing(list(range(len(shards))))
+        # session_id -> connected players, merged from all shards
+        self.registry: Dict[str, int] = {}
+        # Connected clients, to close them on shutdown
+        self.clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        # One lobby connection per shard for registry polls and stats, opened on first use;
+        # the lock keeps a reply paired with its request
+        self.lobby: Dict[int, Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = {}
+        self.lobby_locks = [asyncio.Lock() for _ in shards]
+
+    def shard_for(self, session_id: str) -> Tuple[str, int]:
+        return self.shards[self.ring.node_for(session_id)]
+
+    async def _request(self, index: int, command: str) -> Optional[dict]:
+        """Sends a lobby command to a shard and returns the payload of its reply, or None if it is unreachable."""
+        async with self.lobby_locks[index]:
+            try:
+                if index not in self.lobby:
+                    self.lobby[index] = await asyncio.open_connection(*self.shards[index], limit=MAX_SHARD_FRAME_BYTES)
+                reader, writer = self.lobby[index]
+                writer.write(JSON_CODEC.frame({"command": command}))
+                reply = await JSON_CODEC.read_message_async(reader, MAX_SHARD_FRAME_BYTES)
+            except (OSError, ValueError):
+                reply = None
+            if reply is None:
+                # Reconnect on the next request
+                self.close_lobby(index)
+                return None
+            return reply.get("payload")
+
+    def close_lobby(self, index: int):
+        connection = self.lobby.pop(index, None)
+        if connection:
+            connection[1].close()
+
+    async def poll_registry(self):
+        while True:
+            replies = await asyncio.gather(*(self._request(index, "list_sessions") for index in range(len(self.shards))))
+            # Entries are only added or updated: a session created since the poll started must not vanish
+            for reply in replies:
+                self.registry.update(reply or {})
+            await asyncio.sleep(REGISTRY_POLL_INTERVAL)
+
+    async def collect_stats(self) -> dict:
+        replies = await asyncio.gather(*(self._request(index, "stats") for index in range(len(self.shards))))
+        stats = {'sessions': {}, 'shards': {}}
+        for index, reply in enumerate(replies):
+            if reply:
+                stats['sessions'].update(reply.get('sessions', {}))
+                stats['shards'][index] = {'turn_latency': reply.get('turn_latency'), 'scheduler': reply.get('scheduler')}
+        return stats
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        codec, hello = JSON_CODEC, None
+        address = writer.get_extra_info('peername')
+        task = asyncio.current_task()
+        self.clients[task] = writer
+        try:
+            while True:
+                frame = await codec.read_frame_async(reader, MAX_MESSAGE_BYTES)
+                if frame is None: break
+                data = codec.decode_frame(frame)
+                command = data.get("command")
+
+                if command == HELLO_COMMAND:
+                    hello = data.get("payload", {})
+                    features = set(hello.get("features", [])) & set(FEATURES)
+                    chosen = negotiate(hello.get("codecs", []))
+                    writer.write(codec.frame({"type": "hello", "payload": {"codec": chosen.name, "features": sorted(features)}}))
+                    codec = chosen
+                elif command == "list_sessions":
+                    writer.write(codec.frame({"type": "session_list", "payload": self.registry}))
+                elif command == "stats":
+                    writer.write(codec.frame({"type": "stats", "payload": await self.collect_stats()}))
+                elif command in ("create_session", "join_session"):
+                    if command == "create_session":
+                        session_id = new_session_id()
+                        data["payload"] = dict(data.get("payload") or {}, session_id=session_id)
+                        self.registry.setdefault(session_id, 0)
+                        frame = codec.frame(data)
+                    else:
+                        session_id = (data.get("payload") or {}).get("session_id")
+                        if session_id not in self.registry:
+                            writer.write(codec.frame({"type": "error", "payload": {"message": f"Session '{session_id}' not found."}}))
+                            continue
+                    if not await self.relay(codec, hello, frame, self.shard_for(session_id), reader, writer):
+                        break
+                else:
+                    writer.write(codec.frame({"type": "error", "payload": {"message": "Unknown command"}}))
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            print(f"Client {address} disconnected abruptly: {e}")
+        finally:
+            del self.clients[task]
+            writer.close()
+
+    async def close_clients(self):
+        """Disconnects all clients and waits for their handlers to finish."""
+        tasks = list(self.clients)
+        for writer in self.clients.values():
+            writer.transport.abort()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def relay(self, codec, hello: Optional[dict], first_frame: bytes, shard: Tuple[str, int],
+                    client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter) -> bool:
+        """
+        Relays a client's session traffic to and from a shard, starting with the
+        command that joins the session. Returns True when the client left the
+        session and is back in the lobby, False when either side disconnected.
+        """
+        try:
+            shard_reader, shard_writer = await asyncio.open_connection(*shard, limit=MAX_SHARD_FRAME_BYTES)
+        except OSError as e:
+            print(f"Shard {shard} is unreachable: {e}")
+            client_writer.write(codec.frame({"type": "error", "payload": {"message": "The session's server is unavailable."}}))
+            return True
+        try:
+            if hello is not None:
+                shard_writer.write(JSON_CODEC.frame({"command": HELLO_COMMAND, "payload": hello}))
+                await JSON_CODEC.read_message_async(shard_reader, MAX_SHARD_FRAME_BYTES)
+            shard_writer.write(first_frame)
+            to_client = asyncio.create_task(self._pump(codec, shard_reader, client_writer))
+            try:
+                while True:
+                    frame = await codec.read_frame_async(client_reader, MAX_MESSAGE_BYTES)
+                    if frame is None:
+                        return False
+                    shard_writer.write(frame)
+                    await shard_writer.drain()
+                    if codec.decode_frame(frame).get("command") == "leave_session":
+                        return True
+            finally:
+                to_client.cancel()
+        finally:
+            shard_writer.close()
+
+    async def _pump(self, codec, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Copies whole frames from a shard to the client, so that stopping never cuts one in half."""
+        try:
+            while True:
+                frame = await codec.read_frame_async(reader, MAX_SHARD_FRAME_BYTES)
+                if frame is None:
+                    break
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        # The shard closed the session connection: drop the client too
+        writer.transport.abort()
+
+
+async def serve(host: str, port: int, shards: List[Tuple[str, int]]):
+    router = ShardRouter(shards)
+    stopped = asyncio.Event()
+    # Stop normally on Ctrl-C and SIGTERM, so that whoever started the shards gets to stop them too
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(signum, stopped.set)
+    poller = asyncio.create_task(router.poll_registry())
+    server = await asyncio.start_server(router.handle_client, host, port, limit=MAX_MESSAGE_BYTES, backlog=LISTEN_BACKLOG)
+    async with server:
+        await stopped.wait()
+    poller.cancel()
+    for index in list(router.lobby):
+        router.close_lobby(index)
+    await router.close_clients()
+
+
+def run_router(host: str, port: int, shards: List[Tuple[str, int]]):
+    """Routes clients to the given shard servers until interrupted or terminated."""
+    asyncio.run(serve(host, port, shards))